@@ -0,0 +1,399 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import numpy as np
+import cv2
+from collections import defaultdict
+from tracker import Tracker
+from track_store import TrackStore
+from detector_backend import BACKENDS, load_detector
+from mot_metrics import load_mot_gt, evaluate_tracks, find_gt, print_scores, FramePairs, clear_metrics
+from utils.dataset_utils import list_frame_files, read_images, save_image
+
+'''
+Stage-level benchmark for the tracking pipeline that runs on a CPU-only box without model weights.
+
+A synthetic 1080p sequence (players as coloured rectangles and a white ball on a green pitch)
+is written as JPEGs and pushed through `Tracker` with deterministic stub detectors in place of
+the two YOLO models. The stubs find the drawn objects with colour thresholding, so crops, tiles
+and resized frames all work, and can emulate model latency with --stub-latency-ms.
+
+Reported per stage: calls, total time, frames per second and latency percentiles for decode,
+detect_frames, ByteTrack update, ball selection, fallback, interpolation, drawing and encoding,
+plus the process's peak RSS. Results can be written to JSON and compared with an earlier run
+to catch regressions in tracker.py, image_utils.py and dataset_utils.py between commits.
+
+With --weights and --ball-weights the real models are used instead of the stubs, on --input
+(a frame folder) or the synthetic clip. Listing several --backends and/or --strides runs the same
+clip once per configuration and reports each one's speedup and how closely its tracks match the
+first one, e.g. to weigh a detection stride's throughput against its accuracy loss.
+
+The ONNX backends have no test-time augmentation for the ball fallback, so when they are compared
+with torch, torch also runs without it ("torch no-tta"). Its difference from torch is reported as the
+TTA drop, and each ONNX backend must match it within TOLERANCES: the share of frames where both
+agree on whether there is a ball, the 95th percentile ball centre offset and the F1 of matching
+player boxes at IoU 0.5. A backend outside its tolerance is reported as FAILED and the benchmark
+exits with status 1. When the
+--input folder is the img1 of a MOT sequence with gt/gt.txt (or --gt names one), every run is also
+scored against the ground truth with mot_metrics (MOTA, IDF1, HOTA and the ball hit rate).
+
+Usage:
+python benchmark.py --frames 300 --json bench.json
+python benchmark.py --frames 300 --compare bench.json
+python benchmark.py --input data/data/<sequence>/img1 --frames 300 --weights best.pt --ball-weights ball.pt --backends torch onnx onnx-int8
+'''
+
+PITCH_COLOR = (40, 140, 40)
+TEAM_COLORS = [(200, 60, 60), (60, 60, 200)]
+BALL_COLOR = (255, 255, 255)
+NAMES = {0: "ball", 1: "player"}
+# per ONNX backend: minimum agreement and F1, maximum offset in px, against torch without TTA
+TOLERANCES = {
+    "onnx": {"ball_presence_agreement": 0.98, "ball_p95_center_px": 2.0, "player_match_f1": 0.98},
+    "onnx-int8": {"ball_presence_agreement": 0.9, "ball_p95_center_px": 6.0, "player_match_f1": 0.9},
+}
+STAGES = ["decode", "detect", "flow", "bytetrack", "ball_selection", "fallback", "interpolation", "drawing", "encoding"]
+
+
+class _StubArray:
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class _StubBoxes:
+    def __init__(self, xyxy, class_id, confidence):
+        self.xyxy = _StubArray(np.asarray(xyxy, dtype=np.float32).reshape(-1, 4))
+        self.cls = _StubArray(np.asarray(class_id, dtype=np.float32))
+        self.conf = _StubArray(np.asarray(confidence, dtype=np.float32))
+        self.id = None
+
+
+class _StubResult:
+    """Quacks like an ultralytics Results object as far as `sv.Detections.from_ultralytics` needs."""
+
+    def __init__(self, xyxy, class_id, confidence):
+        self.boxes = _StubBoxes(xyxy, class_id, confidence)
+        self.names = NAMES
+        self.masks = None
+        self.obb = None
+
+
+class StubDetector:
+    """
+    Deterministic stand-in for a YOLO model. Players and the ball are found by colour thresholding;
+    `ball_recall` drops a fixed, position-dependent share of ball detections and `latency_ms`
+    emulates per-image inference cost at imgsz 1024 (scaled with imgsz squared, tripled for augment).
+    """
+
+    def __init__(self, ball_recall=1.0, latency_ms=0.0):
+        self.ball_recall = ball_recall
+        self.latency_ms = latency_ms
+        self.names = NAMES
+
+    def predict(self, source, conf=0.25, iou=0.7, imgsz=640, classes=None, augment=False, agnostic_nms=False, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        if self.latency_ms:
+            cost = self.latency_ms * (imgsz / 1024) ** 2 * (3 if augment else 1)
+            time.sleep(cost * len(images) / 1000)
+        return [self._detect(image, conf, classes) for image in images]
+
+    def _detect(self, image, conf, classes):
+        xyxy, class_ids, confidences = [], [], []
+        if classes is None or 1 in classes:
+            for color in TEAM_COLORS:
+                for box in _find_blobs(image, color, min_area=100):
+                    xyxy.append(box)
+                    class_ids.append(1)
+                    confidences.append(0.9)
+        if classes is None or 0 in classes:
+            for box in _find_blobs(image, BALL_COLOR, min_area=4):
+                if (int(box[0]) * 7 + int(box[1]) * 13) % 100 < self.ball_recall * 100:
+                    xyxy.append(box)
+                    class_ids.append(0)
+                    confidences.append(0.7)
+        keep = [i for i, c in enumerate(confidences) if c >= conf]
+        return _StubResult([xyxy[i] for i in keep], [class_ids[i] for i in keep], [confidences[i] for i in keep])
+
+
+def _find_blobs(image, color, min_area):
+    lower = np.clip(np.array(color) - 30, 0, 255)
+    upper = np.clip(np.array(color) + 30, 0, 255)
+    mask = cv2.inRange(image, lower, upper)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+    return [
+        [x, y, x + w, y + h]
+        for x, y, w, h, area in stats[1:count]
+        if area >= min_area
+    ]
+
+
+def make_synthetic_sequence(output_dir, num_frames, width=1920, height=1080, num_players=22, seed=0):
+    """Writes a deterministic sequence of JPEG frames with moving players and a moving ball."""
+    rng = np.random.default_rng(seed)
+    start = rng.uniform([0, 0], [width - 40, height - 90], size=(num_players, 2))
+    speed = rng.uniform(-4, 4, size=(num_players, 2))
+    for index in range(num_frames):
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:] = PITCH_COLOR
+        positions = np.abs((start + speed * index) % (2 * np.array([width - 40, height - 90])) - np.array([width - 40, height - 90]))
+        for player, (x, y) in enumerate(positions.astype(int)):
+            color = TEAM_COLORS[player % 2]
+            cv2.rectangle(frame, (x, y), (x + 30, y + 70), color, cv2.FILLED)
+            # darker stripes, still within the stub's colour range, give optical flow some texture
+            for stripe in range(y + 5, y + 70, 10):
+                cv2.line(frame, (x, stripe), (x + 30, stripe), tuple(c - 25 for c in color), 2)
+        ball_x = int(width / 2 + (width / 3) * np.sin(index / 25))
+        ball_y = int(height / 2 + (height / 4) * np.cos(index / 40))
+        cv2.circle(frame, (ball_x, ball_y), 5, BALL_COLOR, cv2.FILLED)
+        save_image(frame, output_dir, f"{index + 1:06}.jpg")
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def wrap(self, stage, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+        return timed
+
+    def iterate(self, stage, iterable):
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.samples[stage].append(time.perf_counter() - start)
+            yield item
+
+    def summary(self, num_frames):
+        result = {}
+        for stage in STAGES:
+            samples = np.array(self.samples.get(stage, []))
+            if len(samples) == 0:
+                continue
+            total = float(samples.sum())
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+            result[stage] = {
+                "calls": len(samples),
+                "total_s": total,
+                "fps": num_frames / total if total > 0 else float("inf"),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+            }
+        return result
+
+
+def instrument(tracker, timer):
+    """Wraps the tracker's stage methods on this instance with timers."""
+    tracker._detect_batch = timer.wrap("detect", tracker._detect_batch)
+    tracker.tracker.update_with_detections = timer.wrap("bytetrack", tracker.tracker.update_with_detections)
+    tracker._select_best_ball_bbox = timer.wrap("ball_selection", tracker._select_best_ball_bbox)
+    tracker._fallback_ball_candidates = timer.wrap("fallback", tracker._fallback_ball_candidates)
+    tracker._roi_ball_candidates = timer.wrap("fallback", tracker._roi_ball_candidates)
+    tracker._propagate = timer.wrap("flow", tracker._propagate)
+
+
+def run_benchmark(num_frames=300, width=1920, height=1080, ball_recall=0.8, stub_latency_ms=0.0, read_workers=0,
+                  input_dir=None, models=None, **tracker_kwargs):
+    """
+    Benchmarks one run over `input_dir` (first `num_frames` frames) or a synthetic clip. `models` is a
+    (model, ball_model) pair to use instead of the stub detectors. The tracks are returned as well.
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        output_dir = os.path.join(workdir, "output")
+        if input_dir is None:
+            input_dir = os.path.join(workdir, "img1")
+            make_synthetic_sequence(input_dir, num_frames, width, height)
+        files = list_frame_files(input_dir)[:num_frames]
+        num_frames = len(files)
+
+        timer = StageTimer()
+        if models is None:
+            models = StubDetector(latency_ms=stub_latency_ms), StubDetector(ball_recall=ball_recall, latency_ms=stub_latency_ms)
+        tracker = Tracker(*models, **tracker_kwargs)
+        instrument(tracker, timer)
+
+        start = time.perf_counter()
+        frames = (frame for _, frame in timer.iterate("decode", read_images(files, read_workers)))
+        frame_tracks = []
+        for index, (frame, tracks) in enumerate(tracker.track_frames(frames)):
+            height, width = frame.shape[:2]
+            frame_tracks.append(tracks)
+            timer.wrap("drawing", tracker.annotate_frame)(frame, tracks)
+            timer.wrap("encoding", save_image)(frame, output_dir, f"{index + 1:06}.jpg")
+
+        store = TrackStore.from_frames(frame_tracks)
+        timer.wrap("interpolation", tracker.interpolate_ball_positions)(store)
+        wall = time.perf_counter() - start
+
+    result = {
+        "frames": num_frames,
+        "resolution": [width, height],
+        "tracker": {key: str(value) for key, value in tracker_kwargs.items()},
+        "wall_s": wall,
+        "end_to_end_fps": num_frames / wall,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stages": timer.summary(num_frames),
+    }
+    return result, store
+
+
+def compare_tracks(reference, tracks):
+    """
+    How closely `tracks` follow `reference`: ball presence agreement, ball box and centre offsets,
+    player counts and the F1 of player boxes matched at IoU 0.5.
+    """
+    reference_balls, balls = reference.ball_boxes(), tracks.ball_boxes()
+    reference_found, found = ~np.isnan(reference_balls[:, 0]), ~np.isnan(balls[:, 0])
+    both = reference_found & found
+    offsets = np.abs(reference_balls[both] - balls[both]).max(axis=1) if both.any() else np.zeros(0)
+    center_offsets = np.linalg.norm(
+        (reference_balls[both, :2] + reference_balls[both, 2:] - balls[both, :2] - balls[both, 2:]) / 2, axis=1)
+    player_counts = [(len(a.player_ids), len(b.player_ids)) for a, b in zip(reference, tracks)]
+    pairs = FramePairs(reference, tracks)
+    matched = clear_metrics(pairs)["tp"]
+    return {
+        "ball_presence_agreement": float((reference_found == found).mean()),
+        "ball_max_offset_px": float(offsets.max()) if len(offsets) else 0.0,
+        "ball_p95_offset_px": float(np.percentile(offsets, 95)) if len(offsets) else 0.0,
+        "ball_p95_center_px": float(np.percentile(center_offsets, 95)) if len(center_offsets) else 0.0,
+        "player_count_mean_diff": float(np.mean([abs(a - b) for a, b in player_counts])) if player_counts else 0.0,
+        "player_match_f1": 2 * matched / max(1, len(pairs.gt_frame) + len(pairs.track_frame)),
+    }
+
+
+def check_tolerances(comparison, tolerances):
+    """Returns a message for every value of a `compare_tracks` result outside `tolerances`."""
+    violations = []
+    for key, limit in tolerances.items():
+        value = comparison[key]
+        if value > limit if key.endswith("_px") else value < limit:
+            violations.append(f"{key} {value:.3f} (limit {limit})")
+    return violations
+
+
+def print_report(result, baseline=None):
+    print(f"\n{result['frames']} frames at {result['resolution'][0]}x{result['resolution'][1]}  "
+          f"wall {result['wall_s']:.2f}s  {result['end_to_end_fps']:.1f} fps  peak RSS {result['peak_rss_mb']:.0f} MB")
+    header = f"{'stage':<16}{'calls':>8}{'total s':>10}{'fps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    if baseline:
+        header += f"{'vs base':>10}"
+    print(header)
+    for stage, stats in result["stages"].items():
+        line = (f"{stage:<16}{stats['calls']:>8}{stats['total_s']:>10.3f}{stats['fps']:>10.1f}"
+                f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+        if baseline and stage in baseline["stages"]:
+            line += f"{stats['total_s'] / baseline['stages'][stage]['total_s']:>9.2f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the tracking pipeline with stub detectors.")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--ball-recall", type=float, default=0.8)
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    parser.add_argument("--read-workers", type=int, default=0)
+    parser.add_argument("--fallback-mode", default="full", choices=["full", "roi", "tiled"])
+    parser.add_argument("--input", help="frame folder to use instead of the synthetic clip")
+    parser.add_argument("--weights", help="primary model weights; the stub detectors are used without them")
+    parser.add_argument("--ball-weights", help="ball model weights, used together with --weights")
+    parser.add_argument("--backends", nargs="+", default=["torch"], choices=BACKENDS,
+                        help="detector backends to compare on the same clip, the first being the reference")
+    parser.add_argument("--strides", nargs="+", type=int, default=[1],
+                        help="detection strides to compare on the same clip, e.g. 1 3 5")
+    parser.add_argument("--gt", help="MOT sequence folder with gt/gt.txt to score the tracks against; "
+                                     "by default the one --input belongs to, if any")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="earlier --json output to compare against")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    # the ONNX backends are held to torch without test-time augmentation, which they cannot do
+    check_backends = [backend for backend in args.backends if backend in TOLERANCES] if args.weights else []
+    if check_backends and "torch" not in args.backends:
+        print(f"WARNING: {', '.join(check_backends)} cannot be checked against torch, add it to --backends")
+    configurations = []
+    for backend in (args.backends if args.weights else [None]):
+        configurations += [(backend, stride, None) for stride in args.strides]
+        if backend == "torch" and check_backends:
+            configurations += [(backend, stride, False) for stride in args.strides]
+
+    def config_name(backend, stride, tta):
+        return (backend or "stub") + ("" if tta is None else " no-tta") + (f" stride {stride}" if stride != 1 else "")
+
+    gt_dir = args.gt or (find_gt(args.input) if args.input else None)
+    gt = load_mot_gt(os.path.join(gt_dir, "gt", "gt.txt")) if gt_dir else None
+
+    results, all_tracks, reference = {}, {}, None
+    for backend, stride, tta in configurations:
+        name = config_name(backend, stride, tta)
+        models = None
+        if backend is not None:
+            models = load_detector(args.weights, backend), load_detector(args.ball_weights or args.weights, backend)
+        result, tracks = run_benchmark(
+            args.frames, args.width, args.height, args.ball_recall, args.stub_latency_ms, args.read_workers,
+            input_dir=args.input, models=models, fallback_mode=args.fallback_mode, backend=backend or "torch",
+            detect_stride=stride, ball_tta=tta
+        )
+        all_tracks[name] = tracks
+        if len(configurations) > 1:
+            print(f"\n{name}")
+            if reference is None:
+                reference = (name, result, tracks)
+            else:
+                result["speedup"] = reference[1]["wall_s"] / result["wall_s"]
+                result["vs_reference"] = compare_tracks(reference[2], tracks)
+                print(f"speedup over {reference[0]}: {result['speedup']:.2f}x, tracks: {result['vs_reference']}")
+        if gt is not None:
+            result["accuracy"] = evaluate_tracks(gt, tracks)
+            print_scores(name, result["accuracy"])
+        print_report(result, baseline if baseline is None or "stages" in baseline else baseline.get(name))
+        results[name] = result
+
+    failed = []
+    for backend in check_backends if "torch" in args.backends else []:
+        for stride in args.strides:
+            torch_name, name = config_name("torch", stride, False), config_name(backend, stride, None)
+            tta_drop = compare_tracks(all_tracks[config_name("torch", stride, None)], all_tracks[torch_name])
+            comparison = compare_tracks(all_tracks[torch_name], all_tracks[name])
+            violations = check_tolerances(comparison, TOLERANCES[backend])
+            results[name].update(vs_torch_no_tta=comparison, tta_drop=tta_drop, within_tolerance=not violations)
+            print(f"\n{name} vs {torch_name}: {'OK' if not violations else 'FAILED'} {comparison}")
+            print(f"  TTA drop (torch without vs with test-time augmentation): {tta_drop}")
+            if violations:
+                print(f"  FAILED tolerance: {'; '.join(violations)}")
+                failed.append(name)
+
+    result = results if len(configurations) > 1 else results[name]
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if failed:
+        print(f"\nFAILED: {', '.join(failed)} outside the tolerances against torch, see benchmark.TOLERANCES")
+        sys.exit(1)
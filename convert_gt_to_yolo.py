@@ -1,7 +1,8 @@
 import os
-import yaml
-import torch
-import shutil
+import cv2
+import numpy as np
+from configparser import ConfigParser
+from concurrent.futures import ProcessPoolExecutor
 
 from config import (
     RAW_DATA_DIR,
@@ -25,78 +26,104 @@ Output:
   <class_id> <x_center> <y_center> <width> <height>
 - All output label files are saved in a "labels/" folder inside each dataset path.
 
-The script also prints a count of detected players and balls per frame for debugging purposes.
+gt.txt is loaded as one array and all boxes are normalized at once, using the frame size from the
+sequence's seqinfo.ini (or its first image). With `verbose`, a count of players and balls per frame
+is printed for debugging purposes.
 
 Usage:
-Run the script directly to convert annotations for all test sequences defined in TEST_SRC_DIR.
+Run the script directly to convert the train, val and test sequences in parallel.
 """
 '''
 
 
 TRAIN_SRC_DIRS = [TRAIN_SRC_DIR_1, TRAIN_SRC_DIR_2]
 
-def convert_gt_to_yolo(gt_txt_path, labels_txt_path, output_dir, img_width=1920, img_height=1080):
+WORKERS = os.cpu_count() or 1
+LABEL_LINE = "%d %.6f %.6f %.6f %.6f\n"
+
+
+def get_frame_size(sequence_dir):
+    """Returns (width, height) of a MOT sequence from seqinfo.ini, or from its first image."""
+    seqinfo_path = os.path.join(sequence_dir, "seqinfo.ini")
+    if os.path.exists(seqinfo_path):
+        seqinfo = ConfigParser()
+        seqinfo.read(seqinfo_path)
+        if seqinfo.has_option("Sequence", "imWidth") and seqinfo.has_option("Sequence", "imHeight"):
+            return seqinfo.getint("Sequence", "imWidth"), seqinfo.getint("Sequence", "imHeight")
+
+    img_dir = os.path.join(sequence_dir, "img1")
+    images = sorted(os.listdir(img_dir)) if os.path.isdir(img_dir) else []
+    if not images:
+        raise FileNotFoundError(f"No seqinfo.ini or images to read the frame size of {sequence_dir} from")
+    height, width = cv2.imread(os.path.join(img_dir, images[0])).shape[:2]
+    return width, height
+
+
+def convert_gt_to_yolo(gt_txt_path, labels_txt_path, output_dir, img_width=None, img_height=None, verbose=False):
     """
     Converts gt.txt + labels.txt to YOLO format labels.
     Creates one .txt file per frame with normalized bounding boxes.
-    Also prints the count and coordinates of players and balls in each frame.
+    The frame size is read from the sequence when not given. Returns the number of label files written.
     """
     os.makedirs(output_dir, exist_ok=True)
+    if img_width is None or img_height is None:
+        img_width, img_height = get_frame_size(os.path.dirname(os.path.dirname(os.path.abspath(gt_txt_path))))
+
     # Load class names from labels.txt
     with open(labels_txt_path, 'r') as f:
         classes = [line.strip() for line in f.readlines()]
-    class_dict = {i + 1: name for i, name in enumerate(classes)}  # class_id in gt.txt is 1-indexed
     name_to_index = {name: i for i, name in enumerate(classes)}  # for YOLO class IDs
-
-    label_data = {}
-    frame_objects = {}
-
-    # Parse gt.txt
-    with open(gt_txt_path, 'r') as f:
-        for line in f:
-            parts = line.strip().split(',')
-            frame = int(parts[0])
-            x, y, w, h = float(parts[2]), float(parts[3]), float(parts[4]), float(parts[5])
-            class_id = int(parts[7])
-            class_name = class_dict.get(class_id)
-            if class_name not in name_to_index:
-                continue
-
-            yolo_id = name_to_index[class_name]
-
-            # Convert to YOLO format
-            x_center = (x + w / 2) / img_width
-            y_center = (y + h / 2) / img_height
-            w /= img_width
-            h /= img_height
-
-            line_out = f"{yolo_id} {x_center:.6f} {y_center:.6f} {w:.6f} {h:.6f}\n"
-            frame_file = f"{frame:06}.txt"
-            if frame_file not in label_data:
-                label_data[frame_file] = []
-                frame_objects[frame_file] = {'player': 0, 'ball': 0}
-            label_data[frame_file].append(line_out)
-
-            # Count for debug output
-            if class_name == "player":
-                frame_objects[frame_file]['player'] += 1
-            elif class_name == "ball":
-                frame_objects[frame_file]['ball'] += 1
+    # class_id in gt.txt is 1-indexed; -1 marks ids without a class name
+    yolo_ids = np.array([-1] + [name_to_index[name] for name in classes])
+
+    # frame, x, y, w, h, class_id
+    gt = np.loadtxt(gt_txt_path, delimiter=',', usecols=(0, 2, 3, 4, 5, 7), ndmin=2)
+    class_ids = gt[:, 5].astype(int)
+    known = (class_ids >= 1) & (class_ids < len(yolo_ids))
+    gt, class_ids = gt[known], class_ids[known]
+
+    # Convert to YOLO format, keeping the gt.txt order within each frame
+    boxes = np.empty((len(gt), 5))
+    boxes[:, 0] = yolo_ids[class_ids]
+    boxes[:, 1] = (gt[:, 1] + gt[:, 3] / 2) / img_width
+    boxes[:, 2] = (gt[:, 2] + gt[:, 4] / 2) / img_height
+    boxes[:, 3] = gt[:, 3] / img_width
+    boxes[:, 4] = gt[:, 4] / img_height
+    order = np.argsort(gt[:, 0], kind="stable")
+    frames, boxes = gt[order, 0].astype(int), boxes[order]
 
     # Write YOLO label files
-    for filename, lines in label_data.items():
-        with open(os.path.join(output_dir, filename), 'w') as f:
-            f.writelines(lines)
-
-    print(f"YOLO label files created at: {output_dir}\n")
-    for frame_file, counts in sorted(frame_objects.items()):
-        print(f"{frame_file}: {counts['player']} players, {counts['ball']} balls")
+    frame_numbers, starts, counts = np.unique(frames, return_index=True, return_counts=True)
+    for frame, start, count in zip(frame_numbers, starts, counts):
+        frame_boxes = boxes[start:start + count]
+        with open(os.path.join(output_dir, f"{frame:06}.txt"), 'w') as f:
+            f.write((LABEL_LINE * count) % tuple(frame_boxes.ravel()))
+        if verbose:
+            players = np.count_nonzero(frame_boxes[:, 0] == name_to_index.get("player", -1))
+            balls = np.count_nonzero(frame_boxes[:, 0] == name_to_index.get("ball", -1))
+            print(f"{frame:06}.txt: {players} players, {balls} balls")
+
+    print(f"{len(frame_numbers)} YOLO label files created at: {output_dir}")
+    return len(frame_numbers)
+
+
+def convert_sequence(path, verbose=False):
+    return convert_gt_to_yolo(
+        gt_txt_path=os.path.join(path, "gt", "gt.txt"),
+        labels_txt_path=os.path.join(path, "gt", "labels.txt"),
+        output_dir=os.path.join(path, "labels"),
+        verbose=verbose
+    )
+
+
+def convert_sequences(paths, workers=WORKERS):
+    """Converts several sequences at once, one process per sequence."""
+    paths = list(dict.fromkeys(paths))
+    if workers <= 1 or len(paths) == 1:
+        return [convert_sequence(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        return list(pool.map(convert_sequence, paths))
 
 
 if __name__ == "__main__":
-    for path in TEST_SRC_DIR:
-        convert_gt_to_yolo(
-            gt_txt_path=os.path.join(path, "gt", "gt.txt"),
-            labels_txt_path=os.path.join(path, "gt", "labels.txt"),
-            output_dir=os.path.join(path, "labels")
-        )
+    convert_sequences(TRAIN_SRC_DIRS + [VAL_SRC_DIR, TEST_SRC_DIR])
@@ -1,7 +1,7 @@
 import os
-import shutil
+import yaml
 from glob import glob
-from utils.dataset_utils import copy_files
+from utils.dataset_utils import dataset_file_pairs, sync_files, link_file, resize_image_file
 
 '''
 This script prepares training, validation, and test datasets for the project.
@@ -23,6 +23,24 @@ dataset/
     └── test/
         ├── images/
         └── labels/
+    └── manifest.json
+    └── cache_<imgsz>/
+        ├── train/, val/
+        ├── data.yaml
+        └── manifest.json
+
+The dataset is built incrementally: manifest.json records the source, size, mtime and split of
+every output file, so a rebuild only touches files that were added, changed or dropped. Files are
+hardlinked from the sequences by default (LINK_MODE "symlink" or "copy" are also possible), and
+the remaining file operations run on WORKERS threads. A hardlinked file is the source file, so
+edit labels in the sequences, not in dataset/.
+
+`prepare_training_cache(imgsz, data_yaml)` builds pre-resized copies of the train and val images
+for one training resolution in cache_<imgsz>/ (also incrementally), with the labels linked
+unchanged, and a data.yaml pointing at them. training.py calls it for every stage. The images are
+re-encoded as JPEG (CACHE_JPEG_QUALITY) after resizing (CACHE_INTERPOLATION), so training sees
+slightly different pixels than from the full frames; both settings are recorded in the cache
+manifest, so changing either rebuilds the cache.
 """
 '''
 
@@ -39,20 +57,23 @@ from config import (
     TEST_LABEL_PATH
 )
 
+DATASET_DIR = os.path.dirname(os.path.dirname(TRAIN_IMAGE_PATH))
+MANIFEST_PATH = os.path.join(DATASET_DIR, "manifest.json")
+LINK_MODE = "hardlink"
+CACHE_JPEG_QUALITY = 95
+CACHE_INTERPOLATION = "area"
+WORKERS = 8
 
-def prepare_datasets():
-    print("Preparing training, validation, and test datasets...")
 
-    # Clean up existing directories
-    for path in [TRAIN_IMAGE_PATH, TRAIN_LABEL_PATH, VAL_IMAGE_PATH, VAL_LABEL_PATH, TEST_IMAGE_PATH, TEST_LABEL_PATH]:
-        if os.path.exists(path):
-            shutil.rmtree(path)
+def prepare_datasets(mode=LINK_MODE, workers=WORKERS):
+    print("Preparing training, validation, and test datasets...")
+    entries = []
 
     # Video file 1 for training
     img_dir_1 = os.path.join(TRAIN_SRC_DIR_1, 'img1')
     lbl_dir_1 = os.path.join(TRAIN_SRC_DIR_1, 'labels')
     label_files_1 = [os.path.basename(p) for p in glob(os.path.join(lbl_dir_1, '*.txt')) if 'labels.txt' not in p]
-    copy_files(img_dir_1, lbl_dir_1, TRAIN_IMAGE_PATH, TRAIN_LABEL_PATH, label_files_1, prefix="1")
+    entries += _split_entries("train", dataset_file_pairs(img_dir_1, lbl_dir_1, TRAIN_IMAGE_PATH, TRAIN_LABEL_PATH, label_files_1, prefix="1"))
 
     # Half of video file 2 for training and half for validation
     img_dir_2 = os.path.join(TRAIN_SRC_DIR_2, 'img1')
@@ -62,19 +83,66 @@ def prepare_datasets():
 
     train_files_2 = label_files_2[:split_idx]
     val_files_2 = label_files_2[split_idx:]
-    copy_files(img_dir_2, lbl_dir_2, TRAIN_IMAGE_PATH, TRAIN_LABEL_PATH, train_files_2, prefix="2")
-    copy_files(img_dir_2, lbl_dir_2, VAL_IMAGE_PATH, VAL_LABEL_PATH, val_files_2, prefix="2")
+    entries += _split_entries("train", dataset_file_pairs(img_dir_2, lbl_dir_2, TRAIN_IMAGE_PATH, TRAIN_LABEL_PATH, train_files_2, prefix="2"))
+    entries += _split_entries("val", dataset_file_pairs(img_dir_2, lbl_dir_2, VAL_IMAGE_PATH, VAL_LABEL_PATH, val_files_2, prefix="2"))
 
     # Video file 2 for test
     img_dir_3 = os.path.join(TEST_SRC_DIR, 'img1')
     lbl_dir_3 = os.path.join(TEST_SRC_DIR, 'labels')
     label_files_3 = [os.path.basename(p) for p in glob(os.path.join(lbl_dir_3, '*.txt')) if 'labels.txt' not in p]
-    copy_files(img_dir_3, lbl_dir_3, TEST_IMAGE_PATH, TEST_LABEL_PATH, label_files_3, prefix="3")
+    entries += _split_entries("test", dataset_file_pairs(img_dir_3, lbl_dir_3, TEST_IMAGE_PATH, TEST_LABEL_PATH, label_files_3, prefix="3"))
+
+    # Empty split folders still have to exist for YOLO
+    for path in [TRAIN_IMAGE_PATH, TRAIN_LABEL_PATH, VAL_IMAGE_PATH, VAL_LABEL_PATH, TEST_IMAGE_PATH, TEST_LABEL_PATH]:
+        os.makedirs(path, exist_ok=True)
+    stats = sync_files(entries, MANIFEST_PATH, mode=mode, workers=workers)
 
+    print(f"{stats['linked']} files linked ({mode}), {stats['unchanged']} unchanged, {stats['removed']} removed.")
     print("Training, validation, and test datasets prepared.")
     print(f"Training images: {TRAIN_IMAGE_PATH}")
     print(f"Validation images: {VAL_IMAGE_PATH}")
     print(f"Test images: {TEST_IMAGE_PATH}")
 
+def prepare_training_cache(imgsz, data_yaml, workers=os.cpu_count() or WORKERS):
+    """
+    Builds cache_<imgsz>/ with the train and val images resized so their long side is `imgsz`,
+    re-encoded as JPEG, and their labels linked as they are: YOLO resizes to the same size when
+    loading, so normalized labels stay valid and no full-size frame has to be decoded per epoch.
+    The re-encode is lossy, so the cached pixels are close to, not equal to, the resized originals.
+    Returns the path of a copy of `data_yaml` pointing train and val at the cache.
+    """
+    cache_dir = os.path.join(DATASET_DIR, f"cache_{imgsz}")
+    entries = []
+    for split, image_path, label_path in [("train", TRAIN_IMAGE_PATH, TRAIN_LABEL_PATH), ("val", VAL_IMAGE_PATH, VAL_LABEL_PATH)]:
+        for src_dir in (image_path, label_path):
+            dst_dir = os.path.join(cache_dir, split, os.path.basename(src_dir))
+            os.makedirs(dst_dir, exist_ok=True)
+            entries += [(split, os.path.join(src_dir, name), os.path.join(dst_dir, name)) for name in sorted(os.listdir(src_dir))
+                        if name.lower().endswith((".jpg", ".txt"))]
+
+    def materialize(src, dst):
+        if dst.lower().endswith(".jpg"):
+            resize_image_file(src, dst, imgsz, quality=CACHE_JPEG_QUALITY, interpolation=CACHE_INTERPOLATION)
+        else:
+            link_file(src, dst)
+
+    stats = sync_files(entries, os.path.join(cache_dir, "manifest.json"), mode=f"resize-{imgsz}-{CACHE_INTERPOLATION}-jpeg{CACHE_JPEG_QUALITY}",
+                       workers=workers, materialize=materialize)
+    print(f"Training cache {imgsz}: {stats['linked']} files written, {stats['unchanged']} unchanged, {stats['removed']} removed.")
+
+    with open(data_yaml, "r") as f:
+        data = yaml.safe_load(f)
+    data["train"] = os.path.join(cache_dir, "train", "images")
+    data["val"] = os.path.join(cache_dir, "val", "images")
+    cache_yaml = os.path.join(cache_dir, "data.yaml")
+    with open(cache_yaml, "w") as f:
+        yaml.safe_dump(data, f, sort_keys=False)
+    return cache_yaml
+
+
+def _split_entries(split, pairs):
+    return [(split, src, dst) for src, dst in pairs]
+
+
 if __name__ == "__main__":
     prepare_datasets()
@@ -0,0 +1,28 @@
+import os
+from utils.dataset_utils import build_frame_store
+from config import PROJECT_DIR
+
+'''
+Decodes a sequence's img1/ folder once into a memory-mapped frame store so later runs of
+run_tracker, the tracker experiments or other tools start without any JPEG decoding.
+
+Output:
+- <sequence>/frame_store/frames.npy: all frames as one uint8 array.
+- <sequence>/frame_store/frames_<DETECTOR_IMGSZ>.npy: copy resized to the detector input size.
+- <sequence>/frame_store/index.json: frame names and the source folder.
+
+`load_frames` and `open_frames` pick the store up automatically while it matches the folder.
+
+Usage:
+Run the script (change dir in code)
+'''
+
+INPUT_DIR = os.path.join(PROJECT_DIR, 'data', 'data', '4_annotate_1min_bodo_start', 'img1')
+DETECTOR_IMGSZ = 1024
+WORKERS = 4
+
+
+if __name__ == "__main__":
+    store_dir = build_frame_store(INPUT_DIR, imgsz=DETECTOR_IMGSZ, workers=WORKERS)
+    if store_dir:
+        print(f"Frame store saved to: {store_dir}")
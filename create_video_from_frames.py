@@ -1,12 +1,13 @@
-import cv2
 import os
 from natsort import natsorted
+from utils.dataset_utils import read_images, VideoSink
 
 '''
 This script converts a folder of image frames into a video file.
 Frames must be named in a way that allows for proper sorting (e.g., using frame numbers).
 It reads all .png or .jpg files from the input directory, orders them naturally,
-and writes them into a video using OpenCV.
+and writes them into a video using OpenCV. Frames are decoded on a thread pool ahead of
+the encoder, and encoding runs on a single background thread to keep the frame order.
 
 Output:
 - A single .mp4 video file containing all the frames in sequence.
@@ -18,7 +19,9 @@ Run the script (change dir in code)
 def create_video_from_frames(
     frames_dir="/home/marenfa/dl2/frames_output",
     output_path="/home/marenfa/dl2/tracked_video.mp4",
-    fps=30
+    fps=30,
+    read_workers=4,
+    queue_size=32
 ):
     # Get and sort all image files
     frame_files = [f for f in os.listdir(frames_dir) if f.lower().endswith((".png", ".jpg"))]
@@ -28,24 +31,12 @@ def create_video_from_frames(
         print("No images found in:", frames_dir)
         return
 
-    # Read first frame to get dimensions
-    first_frame = cv2.imread(os.path.join(frames_dir, frame_files[0]))
-    height, width, _ = first_frame.shape
+    # Write all frames to video; the writer takes its size from the first frame
+    frame_paths = [os.path.join(frames_dir, file) for file in frame_files]
+    with VideoSink(output_path, fps=fps, queue_size=queue_size) as sink:
+        for _, frame in read_images(frame_paths, read_workers, queue_size):
+            sink.write(frame)
 
-    # Set up video writer
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-
-    # Write all frames to video
-    for file in frame_files:
-        frame_path = os.path.join(frames_dir, file)
-        frame = cv2.imread(frame_path)
-        if frame is not None:
-            out.write(frame)
-        else:
-            print("Warning: could not read", frame_path)
-
-    out.release()
     print("Video saved to:", output_path)
 
 
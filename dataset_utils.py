@@ -1,38 +1,549 @@
-import os
-import shutil
-import cv2
-
-def save_image(image, output_dir, filename):
-    """Saves an image to the specified directory with the given filename."""
-    os.makedirs(output_dir, exist_ok=True)
-    path = os.path.join(output_dir, filename)
-    cv2.imwrite(path, image)
-
-
-def copy_files(src_img_dir, src_lbl_dir, dst_img_dir, dst_lbl_dir, filenames, prefix):
-    os.makedirs(dst_img_dir, exist_ok=True)
-    os.makedirs(dst_lbl_dir, exist_ok=True)
-
-    for filename in filenames:
-        img_file = os.path.join(src_img_dir, filename.replace(".txt", ".jpg"))
-        lbl_file = os.path.join(src_lbl_dir, filename)
-        if os.path.exists(img_file) and os.path.exists(lbl_file):
-            img_dst = os.path.join(dst_img_dir, f"{prefix}_{filename.replace('.txt', '.jpg')}")
-            lbl_dst = os.path.join(dst_lbl_dir, f"{prefix}_{filename}")
-            shutil.copy2(img_file, img_dst)
-            shutil.copy2(lbl_file, lbl_dst)
-def load_frames(input_dir):
-    image_files = sorted(
-        os.path.join(input_dir, f)
-        for f in os.listdir(input_dir)
-        if os.path.isfile(os.path.join(input_dir, f)) and f.lower().endswith(('.jpg', '.jpeg', '.png'))
-    )
-
-    frames = []
-    for file in image_files:
-        img = cv2.imread(file)
-        if img is None:
-            print(f"Warning: Could not read {file}")
-            continue
-        frames.append(img)
-    return frames, image_files
\ No newline at end of file
+import os
+import json
+import time
+import shutil
+import cv2
+import numpy as np
+import queue
+import threading
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+FRAME_STORE_DIR = "frame_store"
+
+def save_image(image, output_dir, filename):
+    """Saves an image to the specified directory with the given filename."""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, filename)
+    cv2.imwrite(path, image)
+
+
+def copy_files(src_img_dir, src_lbl_dir, dst_img_dir, dst_lbl_dir, filenames, prefix):
+    os.makedirs(dst_img_dir, exist_ok=True)
+    os.makedirs(dst_lbl_dir, exist_ok=True)
+
+    for filename in filenames:
+        img_file = os.path.join(src_img_dir, filename.replace(".txt", ".jpg"))
+        lbl_file = os.path.join(src_lbl_dir, filename)
+        if os.path.exists(img_file) and os.path.exists(lbl_file):
+            img_dst = os.path.join(dst_img_dir, f"{prefix}_{filename.replace('.txt', '.jpg')}")
+            lbl_dst = os.path.join(dst_lbl_dir, f"{prefix}_{filename}")
+            shutil.copy2(img_file, img_dst)
+            shutil.copy2(lbl_file, lbl_dst)
+
+
+def dataset_file_pairs(src_img_dir, src_lbl_dir, dst_img_dir, dst_lbl_dir, filenames, prefix):
+    """The (source, destination) image and label pairs `copy_files` would copy, for `sync_files`."""
+    pairs = []
+    for filename in filenames:
+        img_file = os.path.join(src_img_dir, filename.replace(".txt", ".jpg"))
+        lbl_file = os.path.join(src_lbl_dir, filename)
+        if os.path.exists(img_file) and os.path.exists(lbl_file):
+            pairs.append((img_file, os.path.join(dst_img_dir, f"{prefix}_{filename.replace('.txt', '.jpg')}")))
+            pairs.append((lbl_file, os.path.join(dst_lbl_dir, f"{prefix}_{filename}")))
+    return pairs
+
+
+def link_file(src, dst, mode="hardlink"):
+    """
+    Materializes `src` at `dst` as a "hardlink", "symlink" or "copy", replacing whatever is at `dst`.
+    Links fall back to copying where the file system does not allow them (e.g. across drives).
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        if mode == "hardlink":
+            os.link(src, dst)
+            return
+        if mode == "symlink":
+            os.symlink(os.path.abspath(src), dst)
+            return
+    except OSError:
+        pass
+    shutil.copy2(src, dst)
+
+
+def sync_files(entries, manifest_path, mode="hardlink", workers=8, materialize=None):
+    """
+    Incrementally materializes (split, source, destination) `entries`. A manifest next to the
+    output records each destination's source, size, mtime, split and link mode, so only new or
+    changed files are linked again; files in the destination folders that are no longer part of
+    `entries` are removed if they were in the manifest or have an extension of the dataset files
+    (other files there, e.g. YOLO's .npy image caches, are kept). Returns counts of linked,
+    unchanged and removed files. `materialize(src, dst)`, if given, replaces the linking, and
+    `mode` then only names it in the manifest.
+    """
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    current = {}
+    for split, src, dst in entries:
+        stat = os.stat(src)
+        current[os.path.abspath(dst)] = {
+            "src": os.path.abspath(src),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "split": split,
+            "mode": mode,
+        }
+
+    stale = []
+    extensions = {os.path.splitext(dst)[1].lower() for dst in current}
+    for dst_dir in {os.path.dirname(dst) for dst in current} | {os.path.dirname(dst) for dst in manifest}:
+        if os.path.isdir(dst_dir):
+            stale.extend(
+                path for path in (os.path.join(dst_dir, name) for name in os.listdir(dst_dir))
+                if path not in current and not os.path.isdir(path)
+                and (path in manifest or os.path.splitext(path)[1].lower() in extensions)
+            )
+    changed = [dst for dst, entry in current.items() if manifest.get(dst) != entry or not os.path.lexists(dst)]
+
+    for dst_dir in {os.path.dirname(dst) for dst in changed}:
+        os.makedirs(dst_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(os.remove, stale))
+        materialize = materialize or (lambda src, dst: link_file(src, dst, mode))
+        list(executor.map(lambda dst: materialize(current[dst]["src"], dst), changed))
+
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(current, f)
+    os.replace(tmp_path, manifest_path)
+    return {"linked": len(changed), "unchanged": len(current) - len(changed), "removed": len(stale)}
+
+
+RESIZE_INTERPOLATIONS = {"area": cv2.INTER_AREA, "linear": cv2.INTER_LINEAR, "cubic": cv2.INTER_CUBIC}
+
+
+def resize_image_file(src, dst, imgsz, quality=95, interpolation="area"):
+    """
+    Writes `src` to `dst` as a JPEG of `quality`, resized so its long side is `imgsz` as YOLO's loader
+    would resize it, so normalized labels stay valid. `interpolation` names the filter used when
+    shrinking (see RESIZE_INTERPOLATIONS); enlarging is always linear. The JPEG is lossy, so its pixels
+    differ slightly from resizing the source. Written through a temporary file, so `dst` is never partial.
+    """
+    image = cv2.imread(src)
+    height, width = image.shape[:2]
+    ratio = imgsz / max(height, width)
+    if ratio != 1:
+        size = (round(width * ratio), round(height * ratio))
+        image = cv2.resize(image, size, interpolation=RESIZE_INTERPOLATIONS[interpolation] if ratio < 1 else cv2.INTER_LINEAR)
+    root, extension = os.path.splitext(dst)
+    tmp_path = f"{root}.tmp{extension}"
+    cv2.imwrite(tmp_path, image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if os.path.lexists(dst):
+        os.remove(dst)
+    os.replace(tmp_path, dst)
+
+
+def list_frame_files(input_dir):
+    return sorted(
+        os.path.join(input_dir, f)
+        for f in os.listdir(input_dir)
+        if os.path.isfile(os.path.join(input_dir, f)) and f.lower().endswith(('.jpg', '.jpeg', '.png'))
+    )
+
+
+def read_images(files, workers=0, queue_size=8):
+    """
+    Yields (filename, image) pairs in order. With workers > 0 the next `queue_size` images
+    are decoded on a thread pool while the caller is busy with the current ones.
+    """
+    if workers <= 0:
+        for file in files:
+            img = cv2.imread(file)
+            if img is None:
+                print(f"Warning: Could not read {file}")
+                continue
+            yield file, img
+        return
+
+    files = iter(files)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque((file, executor.submit(cv2.imread, file)) for file in islice(files, max(queue_size, 1)))
+        while pending:
+            file, future = pending.popleft()
+            for next_file in islice(files, 1):
+                pending.append((next_file, executor.submit(cv2.imread, next_file)))
+            img = future.result()
+            if img is None:
+                print(f"Warning: Could not read {file}")
+                continue
+            yield file, img
+
+
+def iter_frames(input_dir, workers=0, queue_size=8):
+    """Yields (filename, frame) pairs one at a time so only the current frame is held in memory."""
+    return read_images(list_frame_files(input_dir), workers, queue_size)
+
+
+def is_video_file(path):
+    return os.path.isfile(path) and path.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def iter_video_frames(video_path, queue_size=0):
+    """
+    Yields (frame_name, frame) pairs decoded from a video file, named 000001.jpg, 000002.jpg, ...
+    like the img1 folders. With queue_size > 0 decoding runs ahead on a background thread.
+    """
+    def decode():
+        capture = cv2.VideoCapture(video_path)
+        if not capture.isOpened():
+            print(f"Warning: Could not open {video_path}")
+            return
+        try:
+            index = 0
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                index += 1
+                yield f"{index:06}.jpg", frame
+        finally:
+            capture.release()
+
+    if queue_size <= 0:
+        yield from decode()
+        return
+
+    buffer = queue.Queue(maxsize=queue_size)
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in decode():
+                if not put(item):
+                    return
+        finally:
+            put(done)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+
+
+def open_frames(source, workers=0, queue_size=8):
+    """Yields (name, frame) pairs from a video file or a folder of frames, using its frame store if one is built."""
+    if is_video_file(source):
+        return iter_video_frames(source, queue_size if workers > 0 else 0)
+    if has_frame_store(source):
+        return FrameStore(get_frame_store_dir(source)).items()
+    return iter_frames(source, workers, queue_size)
+
+
+def list_source_files(source):
+    """Returns the files a frame source reads from, e.g. for fingerprinting."""
+    return [source] if is_video_file(source) else list_frame_files(source)
+
+
+def get_source_fps(source, default=30):
+    if not is_video_file(source):
+        return default
+    capture = cv2.VideoCapture(source)
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    capture.release()
+    return fps if fps and fps > 0 else default
+
+
+class BackgroundWriter:
+    """
+    Runs `write_fn` calls on a thread pool so encoding and disk I/O overlap with the caller.
+    At most `queue_size` writes are pending; the oldest is awaited before new ones are queued,
+    and errors are raised in submission order. Use workers=1 when the order of writes matters.
+    """
+
+    def __init__(self, write_fn, workers=2, queue_size=16):
+        self.write_fn = write_fn
+        self.queue_size = max(queue_size, 1)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.pending = deque()
+
+    def submit(self, *args):
+        while len(self.pending) >= self.queue_size:
+            self.pending.popleft().result()
+        self.pending.append(self.executor.submit(self.write_fn, *args))
+
+    def close(self):
+        try:
+            while self.pending:
+                self.pending.popleft().result()
+        finally:
+            self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class VideoSink:
+    """
+    Writes frames straight into a video file through cv2.VideoWriter on a background thread,
+    optionally also saving each frame as an image to `frames_dir`. The writer is opened with
+    the size of the first frame. With `metrics`, the encoding of each frame is timed as "encode"
+    on the encoder thread, where the work actually happens.
+    """
+
+    def __init__(self, output_path, fps=30, frames_dir=None, fourcc="mp4v", queue_size=16, dump_workers=2, metrics=None):
+        self.output_path = output_path
+        self.fps = fps
+        self.frames_dir = frames_dir
+        self.fourcc = fourcc
+        self.video = None
+        self.count = 0
+        self.metrics = metrics
+        self.encoder = BackgroundWriter(self._write_frame, workers=1, queue_size=queue_size)
+        self.dumper = BackgroundWriter(save_image, dump_workers, queue_size) if frames_dir else None
+
+    def write(self, frame, name=None):
+        self.encoder.submit(frame)
+        if self.dumper is not None:
+            self.dumper.submit(frame, self.frames_dir, name or f"{self.count + 1:06}.jpg")
+        self.count += 1
+
+    def _write_frame(self, frame):
+        if self.video is None:
+            height, width = frame.shape[:2]
+            os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+            self.video = cv2.VideoWriter(self.output_path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (width, height))
+        with self.metrics.timer("encode") if self.metrics is not None else nullcontext():
+            self.video.write(frame)
+
+    def close(self):
+        try:
+            self.encoder.close()
+            if self.dumper is not None:
+                self.dumper.close()
+        finally:
+            if self.video is not None:
+                self.video.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class LiveSource:
+    """
+    Live frame source on a background thread: a camera index or stream URL as it comes, or a video
+    file or frame folder played back at `fps` (its own rate by default) to stand in for a camera.
+    Iterating yields (capture_time, frame) with capture_time from time.perf_counter(). Only the
+    newest frame is kept, so frames that arrive while the consumer is busy are dropped and counted
+    in `dropped` instead of piling up latency.
+    """
+
+    def __init__(self, source, fps=None):
+        self.source = source
+        self.live = isinstance(source, int) or "://" in str(source)
+        self.fps = fps or (None if self.live else get_source_fps(source, default=25))
+        self.captured = 0
+        self.dropped = 0
+        self.latest = None
+        self.done = False
+        self.condition = threading.Condition()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._capture, daemon=True)
+        self.thread.start()
+
+    def _frames(self):
+        if not self.live:
+            for _, frame in open_frames(self.source):
+                yield frame
+            return
+        capture = cv2.VideoCapture(self.source)
+        try:
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                yield frame
+        finally:
+            capture.release()
+
+    def _capture(self):
+        start = time.perf_counter()
+        try:
+            for index, frame in enumerate(self._frames()):
+                if self.stop.is_set():
+                    break
+                if self.fps:
+                    delay = start + index / self.fps - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                with self.condition:
+                    if self.latest is not None:
+                        self.dropped += 1
+                    self.latest = (time.perf_counter(), frame)
+                    self.captured += 1
+                    self.condition.notify()
+        finally:
+            with self.condition:
+                self.done = True
+                self.condition.notify()
+
+    def __iter__(self):
+        while True:
+            with self.condition:
+                while self.latest is None and not self.done:
+                    self.condition.wait()
+                if self.latest is None:
+                    return
+                item, self.latest = self.latest, None
+            yield item
+
+    def close(self):
+        self.stop.set()
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def get_frame_store_dir(input_dir):
+    """Frame stores live next to the frame folder, e.g. <sequence>/frame_store for <sequence>/img1."""
+    return os.path.join(os.path.dirname(os.path.abspath(input_dir)), FRAME_STORE_DIR)
+
+
+def build_frame_store(input_dir, store_dir=None, imgsz=None, workers=4):
+    """
+    Decodes a frame folder once into a uint8 (frames, height, width, 3) .npy file plus an index.json
+    with the frame names, sizes and modification times. With `imgsz`, a copy resized so its long side is `imgsz` is stored as well,
+    e.g. to feed the detector at its inference size.
+    """
+    store_dir = store_dir or get_frame_store_dir(input_dir)
+    os.makedirs(store_dir, exist_ok=True)
+    files = list_frame_files(input_dir)
+    if not files:
+        print(f"No frames found in: {input_dir}")
+        return None
+    # taken before decoding, so a file changed meanwhile invalidates the store
+    stats = [_file_stat(file) for file in files]
+
+    frames = None
+    resized = None
+    names = []
+    for index, (file, img) in enumerate(read_images(files, workers, queue_size=2 * max(workers, 1))):
+        if frames is None:
+            frames = np.lib.format.open_memmap(
+                os.path.join(store_dir, "frames.npy"), mode="w+", dtype=np.uint8, shape=(len(files),) + img.shape)
+            if imgsz:
+                scale = imgsz / max(img.shape[:2])
+                size = (round(img.shape[1] * scale), round(img.shape[0] * scale))
+                resized = np.lib.format.open_memmap(
+                    os.path.join(store_dir, f"frames_{imgsz}.npy"), mode="w+", dtype=np.uint8, shape=(len(files), size[1], size[0], 3))
+        frames[index] = img
+        if resized is not None:
+            resized[index] = cv2.resize(img, (resized.shape[2], resized.shape[1]), interpolation=cv2.INTER_AREA)
+        names.append(os.path.basename(file))
+
+    frames.flush()
+    if resized is not None:
+        resized.flush()
+    with open(os.path.join(store_dir, "index.json"), "w") as f:
+        json.dump({"source_dir": os.path.abspath(input_dir), "filenames": names, "stats": stats,
+                   "sizes": [imgsz] if imgsz else []}, f)
+    return store_dir
+
+
+def _file_stat(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def has_frame_store(input_dir, imgsz=None):
+    """
+    True if a frame store exists for the folder, holds exactly its current frames (same names, sizes
+    and modification times) and, if asked, the `imgsz` copy.
+    """
+    index_path = os.path.join(get_frame_store_dir(input_dir), "index.json")
+    if not os.path.isdir(input_dir) or not os.path.exists(index_path):
+        return False
+    with open(index_path) as f:
+        index = json.load(f)
+    if imgsz and imgsz not in index["sizes"]:
+        return False
+    files = list_frame_files(input_dir)
+    if index["filenames"] != [os.path.basename(file) for file in files] or "stats" not in index:
+        return False
+    return index["stats"] == [_file_stat(file) for file in files]
+
+
+class FrameStore:
+    """
+    Read access to a frame store. Frames are read-only memory maps that share pages through the OS
+    cache across runs and processes; `items` yields a writable copy of each frame instead, so frames
+    can be drawn on while streaming without keeping dirty pages around for the life of the mapping.
+    """
+
+    def __init__(self, store_dir, imgsz=None):
+        with open(os.path.join(store_dir, "index.json")) as f:
+            index = json.load(f)
+        name = f"frames_{imgsz}.npy" if imgsz else "frames.npy"
+        self.frames = np.load(os.path.join(store_dir, name), mmap_mode="r")
+        self.filenames = [os.path.join(index["source_dir"], filename) for filename in index["filenames"]]
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.frames[i] for i in range(*index.indices(len(self)))]
+        return self.frames[index]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.frames[index]
+
+    def items(self):
+        for filename, frame in zip(self.filenames, self):
+            yield filename, np.array(frame)
+
+
+def load_detector_frames(input_dir, imgsz):
+    """Returns the reduced-resolution frames of a frame store, or None if no such copy is built."""
+    if not has_frame_store(input_dir, imgsz):
+        return None
+    return FrameStore(get_frame_store_dir(input_dir), imgsz)
+
+
+def load_frames(input_dir, workers=0):
+    """Loads all frames of a frame folder or video file, memory-mapped if a frame store is built."""
+    if has_frame_store(input_dir):
+        store = FrameStore(get_frame_store_dir(input_dir))
+        return store, store.filenames
+
+    frames = []
+    image_files = []
+    for file, img in open_frames(input_dir, workers):
+        frames.append(img)
+        image_files.append(file)
+    return frames, image_files
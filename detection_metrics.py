@@ -0,0 +1,162 @@
+import os
+import argparse
+import numpy as np
+
+'''
+Standalone detection evaluator working on YOLO txt files, so predictions only have to be made once.
+
+Ground truth is one `<class> <x_center> <y_center> <width> <height>` line per box and predictions
+add a confidence (`save_txt=True, save_conf=True`), all normalized to the image size. IoU does not
+change under scaling the axes, so no image sizes are needed. Matching and AP follow the YOLO
+validator: predictions are matched greedily by IoU to same-class boxes at IoU 0.50:0.95, AP is
+the 101-point interpolated area under the precision-recall curve, and precision and recall are
+taken at the confidence with the best mean F1.
+
+Usage:
+python detection_metrics.py <prediction labels dir> <ground truth labels dir> [--conf 0.25]
+'''
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+_trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+
+def load_yolo_txt(path, columns):
+    """Loads a YOLO txt file as an (n, columns) array; missing or empty files give no rows."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return np.zeros((0, columns))
+    return np.loadtxt(path, ndmin=2)[:, :columns]
+
+
+def xywh_to_xyxy(boxes):
+    xy, wh = boxes[:, :2], boxes[:, 2:4] / 2
+    return np.concatenate([xy - wh, xy + wh], axis=1)
+
+
+def box_iou(boxes_a, boxes_b):
+    """IoU of every xyxy box in `boxes_a` with every one in `boxes_b`, as an (n, m) matrix."""
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+
+def match_predictions(pred_classes, true_classes, iou, iou_thresholds=IOU_THRESHOLDS):
+    """Marks each prediction as a true positive per IoU threshold; `iou` is (n_true, n_pred)."""
+    correct = np.zeros((len(pred_classes), len(iou_thresholds)), dtype=bool)
+    iou = iou * (true_classes[:, None] == pred_classes[None, :])
+    for index, threshold in enumerate(iou_thresholds):
+        matches = np.argwhere(iou >= threshold)
+        if len(matches) > 1:
+            matches = matches[iou[matches[:, 0], matches[:, 1]].argsort()[::-1]]
+            matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
+            matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
+        correct[matches[:, 1], index] = True
+    return correct
+
+
+def compute_ap(recall, precision):
+    recall = np.concatenate(([0.0], recall, [1.0]))
+    precision = np.concatenate(([1.0], precision, [0.0]))
+    precision = np.flip(np.maximum.accumulate(np.flip(precision)))
+    x = np.linspace(0, 1, 101)
+    return _trapezoid(np.interp(x, recall, precision), x)
+
+
+def _smooth(values, fraction=0.1):
+    width = round(len(values) * fraction * 2) // 2 + 1
+    padded = np.concatenate((np.full(width // 2, values[0]), values, np.full(width // 2, values[-1])))
+    return np.convolve(padded, np.ones(width) / width, mode="valid")
+
+
+def ap_per_class(tp, conf, pred_classes, true_classes, eps=1e-16):
+    """Returns the evaluated classes and their precision, recall and (n_classes, n_thresholds) AP."""
+    order = np.argsort(-conf)
+    tp, conf, pred_classes = tp[order], conf[order], pred_classes[order]
+    classes, true_counts = np.unique(true_classes, return_counts=True)
+
+    x = np.linspace(0, 1, 1000)
+    ap = np.zeros((len(classes), tp.shape[1]))
+    precision_curve, recall_curve = np.zeros((len(classes), len(x))), np.zeros((len(classes), len(x)))
+    for index, (cls, true_count) in enumerate(zip(classes, true_counts)):
+        selected = pred_classes == cls
+        if not selected.any():
+            continue
+        tp_cumulative = tp[selected].cumsum(0)
+        fp_cumulative = (1 - tp[selected]).cumsum(0)
+        recall = tp_cumulative / (true_count + eps)
+        precision = tp_cumulative / (tp_cumulative + fp_cumulative)
+        recall_curve[index] = np.interp(-x, -conf[selected], recall[:, 0], left=0)
+        precision_curve[index] = np.interp(-x, -conf[selected], precision[:, 0], left=1)
+        for threshold in range(tp.shape[1]):
+            ap[index, threshold] = compute_ap(recall[:, threshold], precision[:, threshold])
+
+    f1 = 2 * precision_curve * recall_curve / (precision_curve + recall_curve + eps)
+    best = _smooth(f1.mean(0)).argmax()
+    return classes, precision_curve[:, best], recall_curve[:, best], ap
+
+
+def evaluate(pred_dir, label_dir, conf=0.0, iou_thresholds=IOU_THRESHOLDS):
+    """
+    Scores the prediction txt files in `pred_dir` against the label files in `label_dir`, keeping
+    predictions with confidence >= `conf`. Images with no prediction file count as having no
+    detections. Returns overall and per-class precision, recall, mAP50 and mAP50-95.
+    """
+    stems = {os.path.splitext(name)[0] for directory in (pred_dir, label_dir)
+             for name in os.listdir(directory) if name.endswith(".txt")}
+    stats = []
+    true_classes_all = []
+    for stem in sorted(stems):
+        truth = load_yolo_txt(os.path.join(label_dir, stem + ".txt"), 5)
+        predictions = load_yolo_txt(os.path.join(pred_dir, stem + ".txt"), 6)
+        if predictions.shape[1] < 6:
+            raise ValueError(f"{stem}.txt has no confidences; predict with save_conf=True")
+        predictions = predictions[predictions[:, 5] >= conf]
+        true_classes_all.append(truth[:, 0])
+        if len(predictions) == 0:
+            continue
+        iou = box_iou(xywh_to_xyxy(truth[:, 1:5]), xywh_to_xyxy(predictions[:, 1:5]))
+        stats.append((match_predictions(predictions[:, 0], truth[:, 0], iou, iou_thresholds),
+                      predictions[:, 5], predictions[:, 0]))
+
+    true_classes = np.concatenate(true_classes_all) if true_classes_all else np.zeros(0)
+    if stats:
+        tp, confidences, pred_classes = (np.concatenate(column) for column in zip(*stats))
+    else:
+        tp, confidences, pred_classes = np.zeros((0, len(iou_thresholds))), np.zeros(0), np.zeros(0)
+    classes, precision, recall, ap = ap_per_class(tp, confidences, pred_classes, true_classes)
+
+    return {
+        "images": len(stems),
+        "instances": len(true_classes),
+        "precision": float(precision.mean()) if len(classes) else 0.0,
+        "recall": float(recall.mean()) if len(classes) else 0.0,
+        "map50": float(ap[:, 0].mean()) if len(classes) else 0.0,
+        "map50_95": float(ap.mean()) if len(classes) else 0.0,
+        "per_class": {
+            int(cls): {"precision": float(p), "recall": float(r), "map50": float(a[0]), "map50_95": float(a.mean())}
+            for cls, p, r, a in zip(classes, precision, recall, ap)
+        },
+    }
+
+
+def print_metrics(metrics, names=None):
+    print(f"Images: {metrics['images']}, instances: {metrics['instances']}")
+    print(f"mAP50: {metrics['map50']:.3f}")
+    print(f"mAP50-95: {metrics['map50_95']:.3f}")
+    print(f"Precision: {metrics['precision']:.3f}")
+    print(f"Recall: {metrics['recall']:.3f}")
+    for cls, values in metrics["per_class"].items():
+        name = names[cls] if names else cls
+        print(f"  {name}: P {values['precision']:.3f}  R {values['recall']:.3f}  "
+              f"mAP50 {values['map50']:.3f}  mAP50-95 {values['map50_95']:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate saved YOLO predictions against YOLO labels.")
+    parser.add_argument("pred_dir")
+    parser.add_argument("label_dir")
+    parser.add_argument("--conf", type=float, default=0.0, help="drop predictions below this confidence")
+    args = parser.parse_args()
+    print_metrics(evaluate(args.pred_dir, args.label_dir, args.conf))
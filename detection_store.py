@@ -0,0 +1,115 @@
+import json
+import numpy as np
+
+'''
+Compact on-disk store for raw per-frame detections.
+
+Detections of the primary model and of the fallback ball model are kept as flat arrays
+(xyxy, class_id, confidence) with per-frame offsets, so a whole match fits in a few MB and
+loads instantly. `Tracker.retrack_from_detections` replays ByteTrack and ball selection from
+such a store, which makes sweeping tracker parameters possible without re-running YOLO.
+
+With a detection stride, frames between keyframes hold no model output: their detections are the
+previous frame's moved by optical flow. Those frames are flagged as propagated and keep the
+flow-moved ball next to the moved player boxes, so a replay can reproduce or skip them
+instead of mistaking them for raw detections.
+'''
+
+
+class DetectionStore:
+    def __init__(self, names=None):
+        self.names = names
+        self._primary = []
+        self._fallback = {}
+        self._propagated = {}
+
+    def __len__(self):
+        return len(self._primary)
+
+    def append(self, detections, fallback_candidates=None, propagated=False, ball_bbox=None):
+        """
+        Adds one frame: the primary sv.Detections and, if the fallback ran, its (bbox, class_id, confidence) candidates.
+        A `propagated` frame holds flow-moved detections instead, with the moved `ball_bbox` if the ball was followed.
+        """
+        self._primary.append((
+            np.asarray(detections.xyxy, dtype=np.float32).reshape(-1, 4),
+            np.asarray(detections.class_id, dtype=np.int16),
+            np.asarray(detections.confidence, dtype=np.float32)
+        ))
+        if fallback_candidates is not None:
+            self._fallback[len(self._primary) - 1] = _candidates_to_arrays(fallback_candidates)
+        if propagated:
+            self._propagated[len(self._primary) - 1] = (
+                np.full(4, np.nan, np.float32) if ball_bbox is None else np.asarray(ball_bbox, dtype=np.float32))
+
+    def primary(self, index):
+        import supervision as sv
+        xyxy, class_id, confidence = self._primary[index]
+        return sv.Detections(xyxy=xyxy.astype(np.float32), class_id=class_id.astype(int), confidence=confidence)
+
+    def fallback(self, index):
+        """Returns the fallback candidates for a frame, or None if the fallback model never ran on it."""
+        if index not in self._fallback:
+            return None
+        xyxy, class_id, confidence = self._fallback[index]
+        return list(zip(xyxy, class_id.astype(int), confidence))
+
+    def is_propagated(self, index):
+        return index in self._propagated
+
+    def propagated_ball(self, index):
+        """Returns the flow-moved ball bbox of a propagated frame, or None if the ball was not followed."""
+        ball_bbox = self._propagated[index]
+        return None if np.isnan(ball_bbox).any() else ball_bbox
+
+    def save(self, path):
+        fallback_frames = np.array(sorted(self._fallback), dtype=np.int32)
+        propagated_frames = np.array(sorted(self._propagated), dtype=np.int32)
+        np.savez_compressed(
+            path,
+            names=np.array(json.dumps({int(k): v for k, v in (self.names or {}).items()})),
+            **_pack("primary", self._primary),
+            fallback_frames=fallback_frames,
+            **_pack("fallback", [self._fallback[index] for index in fallback_frames]),
+            propagated_frames=propagated_frames,
+            propagated_ball=np.array([self._propagated[index] for index in propagated_frames], np.float32).reshape(-1, 4)
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            store = cls({int(k): v for k, v in json.loads(str(data["names"])).items()})
+            store._primary = _unpack("primary", data)
+            store._fallback = dict(zip(data["fallback_frames"].tolist(), _unpack("fallback", data)))
+            if "propagated_frames" in data:
+                store._propagated = dict(zip(data["propagated_frames"].tolist(), data["propagated_ball"]))
+        return store
+
+
+def _candidates_to_arrays(candidates):
+    if not candidates:
+        return np.empty((0, 4), np.float32), np.empty(0, np.int16), np.empty(0, np.float32)
+    xyxy, class_id, confidence = zip(*candidates)
+    return (np.asarray(xyxy, dtype=np.float32).reshape(-1, 4),
+            np.asarray(class_id, dtype=np.int16),
+            np.asarray(confidence, dtype=np.float32))
+
+
+def _pack(prefix, frames):
+    offsets = np.zeros(len(frames) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(class_id) for _, class_id, _ in frames])
+    return {
+        f"{prefix}_offsets": offsets,
+        f"{prefix}_xyxy": np.concatenate([xyxy for xyxy, _, _ in frames]) if frames else np.empty((0, 4), np.float32),
+        f"{prefix}_class_id": np.concatenate([c for _, c, _ in frames]) if frames else np.empty(0, np.int16),
+        f"{prefix}_confidence": np.concatenate([c for _, _, c in frames]) if frames else np.empty(0, np.float32),
+    }
+
+
+def _unpack(prefix, data):
+    offsets = data[f"{prefix}_offsets"]
+    xyxy, class_id, confidence = data[f"{prefix}_xyxy"], data[f"{prefix}_class_id"], data[f"{prefix}_confidence"]
+    return [
+        (xyxy[start:end], class_id[start:end], confidence[start:end])
+        for start, end in zip(offsets[:-1], offsets[1:])
+    ]
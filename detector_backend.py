@@ -0,0 +1,77 @@
+import os
+import json
+from track_cache import fingerprint_weights
+
+'''
+Detector backends for the tracker's YOLO models.
+
+- "torch": the trained .pt weights run by PyTorch, as before.
+- "onnx": the weights exported once to ONNX (dynamic input size and batch, so the primary imgsz,
+  the full-frame ball fallback, ROI crops and tiles all share one export) and run by ONNX Runtime.
+- "onnx-int8": the ONNX export with weights dynamically quantized to INT8, for CPU-only nodes.
+
+Exports are cached next to the weights as <name>.onnx / <name>.int8.onnx with a small
+<export>.json sidecar holding the fingerprint of the weights they came from, so retraining
+re-exports on the next load and an unchanged model is never exported twice. Either way the
+model is loaded through `YOLO`, so `predict` and its Results are the same for every backend.
+Ultralytics (and with it torch) is only imported on the first load or export, see `import_backend`.
+
+ONNX Runtime has no test-time augmentation, so the ball fallback runs without `augment` on the
+ONNX backends (see `Tracker.ball_tta`). Check the tracks against the torch backend on a real clip with
+`python benchmark.py --input <img1 folder> --weights ... --ball-weights ... --backends torch onnx onnx-int8`,
+which holds each ONNX backend to the tolerances in `benchmark.TOLERANCES` and reports the TTA drop.
+'''
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def import_backend():
+    """Imports and returns ultralytics' `YOLO`; deferred so that importing this module stays cheap."""
+    from ultralytics import YOLO
+    return YOLO
+
+
+def load_detector(weights_path, backend="torch"):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown detector backend {backend!r}, expected one of {BACKENDS}")
+    YOLO = import_backend()
+    if backend == "torch":
+        return YOLO(weights_path)
+    return YOLO(export_onnx(weights_path, quantize=backend == "onnx-int8"), task="detect")
+
+
+def export_onnx(weights_path, quantize=False):
+    """Returns the path of the cached ONNX export of `weights_path`, exporting it first if needed."""
+    stem = os.path.splitext(weights_path)[0]
+    onnx_path = stem + ".onnx"
+    source = {"weights": fingerprint_weights(weights_path), "dynamic": True}
+
+    if not _is_current(onnx_path, source):
+        exported = import_backend()(weights_path).export(format="onnx", dynamic=True, simplify=True)
+        if os.path.abspath(exported) != os.path.abspath(onnx_path):
+            os.replace(exported, onnx_path)
+        _write_sidecar(onnx_path, source)
+
+    if not quantize:
+        return onnx_path
+
+    int8_path = stem + ".int8.onnx"
+    source = {**source, "quantization": "dynamic-int8"}
+    if not _is_current(int8_path, source):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+        _write_sidecar(int8_path, source)
+    return int8_path
+
+
+def _is_current(export_path, source):
+    try:
+        with open(export_path + ".json") as f:
+            return os.path.exists(export_path) and json.load(f) == source
+    except (OSError, ValueError):
+        return False
+
+
+def _write_sidecar(export_path, source):
+    with open(export_path + ".json", "w") as f:
+        json.dump(source, f)
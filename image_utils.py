@@ -10,6 +10,27 @@ def get_bbox_width(bbox):
     x1, _, x2, _ = bbox
     return x2 - x1
 
+def get_search_window(center, size, frame_width, frame_height):
+    """Returns a square (x1, y1, x2, y2) window of `size` px around `center`, shifted to lie inside the frame."""
+    w = int(min(size, frame_width))
+    h = int(min(size, frame_height))
+    x1 = int(min(max(center[0] - w / 2, 0), frame_width - w))
+    y1 = int(min(max(center[1] - h / 2, 0), frame_height - h))
+    return x1, y1, x1 + w, y1 + h
+
+def get_tile_windows(frame_width, frame_height, tile_size, overlap=0.2):
+    """Returns overlapping (x1, y1, x2, y2) tiles covering the frame; the last row and column end on the frame edge."""
+    stride = max(int(tile_size * (1 - overlap)), 1)
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        return list(range(0, length - tile_size, stride)) + [length - tile_size]
+
+    w = min(tile_size, frame_width)
+    h = min(tile_size, frame_height)
+    return [(x, y, x + w, y + h) for y in starts(frame_height) for x in starts(frame_width)]
+
 def draw_ellipse(frame, bbox, color, track_id=None):
     y2 = int(bbox[3])
     x_c, _ = get_center_of_bbox(bbox)
@@ -35,6 +56,14 @@ def draw_triangle(frame, bbox, color):
     cv2.drawContours(frame, [pts], 0, (0, 0, 0), 2)
     return frame
 
+def draw_tracks(frame, player_ids, player_boxes, ball_bbox):
+    """Draws player ellipses and the ball triangle for one frame in place."""
+    for track_id, bbox in zip(player_ids, player_boxes):
+        draw_ellipse(frame, bbox, (0, 0, 255), int(track_id))
+    if ball_bbox is not None:
+        draw_triangle(frame, ball_bbox, (0, 255, 0))
+    return frame
+
 def draw_boxes_on_frame(image_path, label_path, class_names, output_path, img_width=1920, img_height=1080):
     image = cv2.imread(image_path)
     if image is None:
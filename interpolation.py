@@ -0,0 +1,96 @@
+import numpy as np
+from collections import deque
+
+'''
+Vectorized ball position interpolation.
+
+`interpolate_boxes` fills the NaN rows of an (N, 4) box array in one pass: interior gaps are
+linearly interpolated, leading gaps take the first known box and trailing gaps hold the last
+one, which matches the previous pandas `interpolate().bfill()` behaviour. Gaps longer than
+`max_gap` frames are left empty.
+
+`StreamingInterpolator` does the same incrementally for streaming tracking: the box for
+frame t is emitted once frame t + lag has been seen. Gaps that close within the lag are
+interpolated, longer ones hold the last known box until they are longer than `max_gap` and are
+left empty from then on. With lag >= max_gap no gap is held, so the output matches `interpolate_boxes`.
+'''
+
+
+def interpolate_boxes(boxes, max_gap=None):
+    boxes = np.asarray(boxes, dtype=np.float32)
+    valid = ~np.isnan(boxes).any(axis=1)
+    known = np.flatnonzero(valid)
+    if len(known) == 0:
+        return boxes.copy()
+
+    positions = np.arange(len(boxes))
+    result = np.stack([np.interp(positions, known, boxes[known, column]) for column in range(4)], axis=1).astype(np.float32)
+
+    if max_gap is not None:
+        previous_valid = np.maximum.accumulate(np.where(valid, positions, -1))
+        next_valid = np.minimum.accumulate(np.where(valid, positions, len(boxes))[::-1])[::-1]
+        gap_length = next_valid - previous_valid - 1
+        result[~valid & (gap_length > max_gap)] = np.nan
+
+    return result
+
+
+class StreamingInterpolator:
+    def __init__(self, lag=10, max_gap=None):
+        self.lag = lag
+        self.max_gap = max_gap
+        self.pending = deque()
+        self.last_index = None
+        self.last_box = None
+        self.count = 0
+
+    def push(self, box):
+        """Adds the next frame's box (or None) and returns the (index, box) pairs that are now final."""
+        index = self.count
+        self.count += 1
+
+        if box is None:
+            self.pending.append([index, None, False])
+        else:
+            box = np.asarray(box, dtype=np.float32)
+            self._close_gap(index, box)
+            self.pending.append([index, box, True])
+            self.last_index, self.last_box = index, box
+
+        return self._emit(index - self.lag)
+
+    def flush(self):
+        """Returns all remaining (index, box) pairs at the end of the sequence."""
+        if self.max_gap is not None and self.last_index is not None and self.count - 1 - self.last_index > self.max_gap:
+            for item in self.pending:
+                if not item[2]:
+                    item[1], item[2] = None, True
+        return self._emit(self.count)
+
+    def _close_gap(self, index, box):
+        open_items = [item for item in self.pending if not item[2]]
+        if not open_items:
+            return
+        gap_length = index - (self.last_index if self.last_index is not None else -1) - 1
+        too_long = self.max_gap is not None and gap_length > self.max_gap
+
+        for item in open_items:
+            if too_long:
+                item[1] = None
+            elif self.last_index is None:
+                item[1] = box
+            else:
+                weight = (item[0] - self.last_index) / (index - self.last_index)
+                item[1] = self.last_box + (box - self.last_box) * weight
+            item[2] = True
+
+    def _emit(self, up_to):
+        ready = []
+        while self.pending and self.pending[0][0] <= up_to:
+            index, box, resolved = self.pending.popleft()
+            if not resolved and self.last_box is not None:
+                # the gap is still open: hold the last known box unless the gap seen so far is already too long
+                if self.max_gap is None or self.count - 1 - self.last_index <= self.max_gap:
+                    box = self.last_box
+            ready.append((index, box))
+        return ready
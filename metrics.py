@@ -0,0 +1,164 @@
+import os
+import json
+import time
+from bisect import bisect_left
+
+'''
+Lightweight run metrics for the tracker: timers, counters and histograms.
+
+A `Metrics` object collects values during a run and writes a summary either as one JSON line
+appended to a log (one line per run, so slow clips and regressions can be grepped later) or as
+a Prometheus text-format file for a node-exporter textfile collector.
+
+Instrumented code calls `metrics.timer(name)`, `metrics.count(name)` and `metrics.observe(name, value)`
+unconditionally. `NULL_METRICS` (a disabled `Metrics`) turns each call into an immediate return, so
+the instrumentation costs next to nothing when metrics are off.
+'''
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 15, 20, 25, 30, 40, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "max": self.max,
+        }
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    def __init__(self, enabled=True, prefix="tracker"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def timer(self, name):
+        """Context manager adding the time spent in its block to the `<name>_seconds` histogram."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self._histogram(name + "_seconds", TIME_BUCKETS))
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value, buckets=COUNT_BUCKETS):
+        if self.enabled:
+            self._histogram(name, buckets).observe(value)
+
+    def snapshot(self, **labels):
+        elapsed = time.time() - self.started
+        snapshot = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            **labels,
+            "elapsed_s": elapsed,
+            "counters": dict(self.counters),
+            "histograms": {name: histogram.summary() for name, histogram in self.histograms.items()},
+        }
+        frames = self.counters.get("frames")
+        if frames:
+            snapshot["fps"] = frames / elapsed if elapsed > 0 else None
+            snapshot["fallback_rate"] = self.counters.get("fallback_frames", 0) / frames
+        return snapshot
+
+    def write_jsonl(self, path, **labels):
+        """Appends a summary of this run as one JSON line."""
+        if not self.enabled:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a") as f:
+            f.write(json.dumps(self.snapshot(**labels)) + "\n")
+
+    def write_prometheus(self, path, **labels):
+        """Writes all metrics in the Prometheus text exposition format, replacing the file atomically."""
+        if not self.enabled:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            metric = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_labels(label_text)} {value}")
+        for name, histogram in sorted(self.histograms.items()):
+            metric = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += count
+                bucket_label = f'le="{bound}"'
+                lines.append(f"{metric}_bucket{_labels(label_text, bucket_label)} {cumulative}")
+            lines.append(f"{metric}_sum{_labels(label_text)} {histogram.sum}")
+            lines.append(f"{metric}_count{_labels(label_text)} {histogram.count}")
+        snapshot = self.snapshot()
+        for name in ("fps", "fallback_rate"):
+            if snapshot.get(name) is not None:
+                lines.append(f"# TYPE {self.prefix}_{name} gauge")
+                lines.append(f"{self.prefix}_{name}{_labels(label_text)} {snapshot[name]}")
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+
+    def _histogram(self, name, buckets):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(buckets)
+        return histogram
+
+
+def _labels(*parts):
+    text = ",".join(part for part in parts if part)
+    return "{" + text + "}" if text else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+NULL_METRICS = Metrics(enabled=False)
@@ -0,0 +1,279 @@
+import os
+import argparse
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from track_store import TrackStore, PLAYER, BALL
+
+'''
+Tracking accuracy against MOTChallenge ground truth (gt/gt.txt + gt/labels.txt).
+
+Ground truth is loaded into a TrackStore (class "ball" as BALL, every other class as PLAYER, MOT
+frame 1 as frame index 0) so it lines up with the tracker's tracks.npz. Player tracks are scored with
+- CLEAR MOT: MOTA, MOTP, FP, FN and ID switches, matching at IoU >= `iou_threshold`
+- identity: IDF1, IDP and IDR with one global ground truth id to track id assignment
+- HOTA, DetA and AssA averaged over the localization thresholds 0.05:0.95
+following the TrackEval definitions. The ball is a single track, so it gets a hit rate instead:
+a ground truth ball counts as hit when the tracked ball's centre lies inside its box grown by
+`ball_margin` px, which stays meaningful for a ball only a few pixels wide.
+
+Every ground truth box is paired with every track box of the same frame in one flat array, so the
+IoUs, the per-id match counts and the HOTA alignment scores of a whole sequence are computed in
+a few vectorized passes; only the small per-frame assignments run in a loop.
+
+Usage:
+python mot_metrics.py <sequence dir with gt/> <tracks.npz> [<tracks.npz> ...]
+'''
+
+HOTA_THRESHOLDS = np.arange(0.05, 0.99, 0.05)
+EPS = np.finfo(float).eps
+
+
+def load_mot_gt(gt_txt_path, labels_txt_path=None, num_frames=None):
+    """Loads gt.txt as a TrackStore; rows marked as not to be considered (column 7 == 0) are skipped."""
+    if labels_txt_path is None:
+        labels_txt_path = os.path.join(os.path.dirname(gt_txt_path), "labels.txt")
+    with open(labels_txt_path, 'r') as f:
+        classes = [line.strip() for line in f.readlines()]
+    # class_id in gt.txt is 1-indexed
+    kinds = np.array([-1] + [BALL if name == "ball" else PLAYER for name in classes], dtype=np.int8)
+
+    # frame, id, x, y, w, h, consider, class_id
+    gt = np.loadtxt(gt_txt_path, delimiter=',', usecols=range(8), ndmin=2)
+    class_ids = gt[:, 7].astype(int)
+    gt = gt[(gt[:, 6] != 0) & (class_ids >= 1) & (class_ids < len(kinds))]
+    gt = gt[np.argsort(gt[:, 0], kind="stable")]
+
+    frame_index = gt[:, 0].astype(np.int32) - 1
+    if num_frames is None:
+        num_frames = int(frame_index.max()) + 1 if len(gt) else 0
+    keep = frame_index < num_frames
+    gt, frame_index = gt[keep], frame_index[keep]
+
+    offsets = np.zeros(num_frames + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(frame_index, minlength=num_frames))
+    bbox = np.concatenate([gt[:, 2:4], gt[:, 2:4] + gt[:, 4:6]], axis=1).astype(np.float32)
+    return TrackStore(offsets, frame_index, gt[:, 1].astype(np.int32), kinds[gt[:, 7].astype(int)], bbox)
+
+
+def pairwise_iou(boxes_a, boxes_b):
+    """Element-wise IoU of two equally long (n, 4) xyxy box arrays."""
+    width = np.clip(np.minimum(boxes_a[:, 2], boxes_b[:, 2]) - np.maximum(boxes_a[:, 0], boxes_b[:, 0]), 0, None)
+    height = np.clip(np.minimum(boxes_a[:, 3], boxes_b[:, 3]) - np.maximum(boxes_a[:, 1], boxes_b[:, 1]), 0, None)
+    intersection = width * height
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    return intersection / np.maximum(area_a + area_b - intersection, EPS)
+
+
+class FramePairs:
+    """
+    All (ground truth, track) box pairs that share a frame, for boxes of one kind. Ids are remapped
+    to 0..n-1. The pairs of frame f are `pair_offsets[f]:pair_offsets[f + 1]` and form a row-major
+    (ground truth boxes x track boxes) matrix of that frame.
+    """
+
+    def __init__(self, gt, tracks, kind=PLAYER):
+        num_frames = max(len(gt), len(tracks))
+        gt_mask, track_mask = gt.kind == kind, tracks.kind == kind
+        self.gt_frame, self.track_frame = gt.frame_index[gt_mask], tracks.frame_index[track_mask]
+        gt_ids, self.gt_id = np.unique(gt.track_id[gt_mask], return_inverse=True)
+        track_ids, self.track_id = np.unique(tracks.track_id[track_mask], return_inverse=True)
+        self.num_gt_ids, self.num_track_ids = len(gt_ids), len(track_ids)
+
+        self.gt_counts = np.bincount(self.gt_frame, minlength=num_frames)
+        self.track_counts = np.bincount(self.track_frame, minlength=num_frames)
+        self.gt_starts = np.concatenate([[0], np.cumsum(self.gt_counts)])
+        self.track_starts = np.concatenate([[0], np.cumsum(self.track_counts)])
+
+        # both stores are sorted by frame, so each ground truth row pairs with a contiguous run of track rows
+        repeats = self.track_counts[self.gt_frame]
+        self.gt_row = np.repeat(np.arange(len(self.gt_frame)), repeats)
+        run_starts = np.cumsum(repeats) - repeats
+        self.track_row = (np.repeat(self.track_starts[self.gt_frame], repeats)
+                          + np.arange(repeats.sum()) - np.repeat(run_starts, repeats))
+        self.pair_offsets = np.concatenate([[0], np.cumsum(self.gt_counts * self.track_counts)])
+        self.iou = pairwise_iou(gt.bbox[gt_mask][self.gt_row], tracks.bbox[track_mask][self.track_row])
+        self.pair_gt_id, self.pair_track_id = self.gt_id[self.gt_row], self.track_id[self.track_row]
+
+    def frames(self):
+        """Yields (frame, ground truth rows, track rows, pair slice) for frames with pairs."""
+        for frame in np.flatnonzero(self.gt_counts * self.track_counts):
+            yield (frame, np.arange(self.gt_starts[frame], self.gt_starts[frame + 1]),
+                   np.arange(self.track_starts[frame], self.track_starts[frame + 1]),
+                   slice(self.pair_offsets[frame], self.pair_offsets[frame + 1]))
+
+
+def clear_metrics(pairs, iou_threshold=0.5):
+    """
+    MOTA, MOTP, FP, FN and ID switches. As in TrackEval, only the matches of the last frame with both
+    ground truth and tracks are preferred where still valid; frames without ground truth or without
+    tracks leave them as they are.
+    """
+    num_gt, num_tracks = len(pairs.gt_frame), len(pairs.track_frame)
+    previous = np.full(pairs.num_gt_ids, -1)
+    last_matched = np.full(pairs.num_gt_ids, -1)
+    matches, switches, total_iou = 0, 0, 0.0
+    for frame, gt_rows, track_rows, pair_slice in pairs.frames():
+        iou = pairs.iou[pair_slice].reshape(len(gt_rows), len(track_rows))
+        gt_ids, track_ids = pairs.gt_id[gt_rows], pairs.track_id[track_rows]
+        score = np.where(iou >= iou_threshold - EPS, iou, 0.0)
+        score += 1000 * (score > 0) * (previous[gt_ids][:, None] == track_ids[None, :])
+        rows, columns = linear_sum_assignment(-score)
+        matched = score[rows, columns] > 0
+        rows, columns = rows[matched], columns[matched]
+
+        matched_gt, matched_tracks = gt_ids[rows], track_ids[columns]
+        switches += int(np.count_nonzero((last_matched[matched_gt] != -1) & (last_matched[matched_gt] != matched_tracks)))
+        previous[:] = -1
+        previous[matched_gt] = matched_tracks
+        last_matched[matched_gt] = matched_tracks
+        matches += len(rows)
+        total_iou += float(iou[rows, columns].sum())
+
+    false_negatives, false_positives = num_gt - matches, num_tracks - matches
+    return {
+        "mota": 1 - (false_negatives + false_positives + switches) / max(1, num_gt),
+        "motp": total_iou / max(1, matches),
+        "tp": matches,
+        "fp": false_positives,
+        "fn": false_negatives,
+        "id_switches": switches,
+    }
+
+
+def identity_metrics(pairs, iou_threshold=0.5):
+    """IDF1, IDP and IDR from the id assignment that maximizes the identity true positives."""
+    num_gt, num_tracks = len(pairs.gt_frame), len(pairs.track_frame)
+    counts = np.zeros((pairs.num_gt_ids, pairs.num_track_ids))
+    close = pairs.iou >= iou_threshold - EPS
+    np.add.at(counts, (pairs.pair_gt_id[close], pairs.pair_track_id[close]), 1)
+    rows, columns = linear_sum_assignment(-counts)
+    id_tp = float(counts[rows, columns].sum())
+    return {
+        "idf1": 2 * id_tp / max(1, num_gt + num_tracks),
+        "idp": id_tp / max(1, num_tracks),
+        "idr": id_tp / max(1, num_gt),
+    }
+
+
+def hota_metrics(pairs, thresholds=HOTA_THRESHOLDS):
+    """HOTA, DetA, AssA and LocA averaged over the localization thresholds."""
+    num_gt, num_tracks = len(pairs.gt_frame), len(pairs.track_frame)
+    if num_gt == 0 or num_tracks == 0:
+        return {"hota": 0.0, "deta": 0.0, "assa": 0.0, "loca": 1.0}
+
+    # global alignment of every id pair, from the per-frame IoUs normalized by the other boxes' overlaps
+    row_sums = np.bincount(pairs.gt_row, pairs.iou, minlength=num_gt)
+    column_sums = np.bincount(pairs.track_row, pairs.iou, minlength=num_tracks)
+    denominator = row_sums[pairs.gt_row] + column_sums[pairs.track_row] - pairs.iou
+    normalized = np.divide(pairs.iou, denominator, out=np.zeros_like(pairs.iou), where=denominator > EPS)
+    potential = np.zeros((pairs.num_gt_ids, pairs.num_track_ids))
+    np.add.at(potential, (pairs.pair_gt_id, pairs.pair_track_id), normalized)
+    gt_id_counts = np.bincount(pairs.gt_id, minlength=pairs.num_gt_ids)[:, None]
+    track_id_counts = np.bincount(pairs.track_id, minlength=pairs.num_track_ids)[None, :]
+    alignment = potential / (gt_id_counts + track_id_counts - potential)
+
+    # one assignment per frame, shared by all thresholds
+    matched_pairs = []
+    for frame, gt_rows, track_rows, pair_slice in pairs.frames():
+        score = (alignment[pairs.pair_gt_id[pair_slice], pairs.pair_track_id[pair_slice]] * pairs.iou[pair_slice])
+        rows, columns = linear_sum_assignment(-score.reshape(len(gt_rows), len(track_rows)))
+        matched_pairs.append(pair_slice.start + rows * len(track_rows) + columns)
+    matched = np.concatenate(matched_pairs) if matched_pairs else np.zeros(0, dtype=int)
+    matched_iou = pairs.iou[matched]
+
+    hota, deta, assa, loca = [], [], [], []
+    for threshold in thresholds:
+        selected = matched[matched_iou >= threshold - EPS]
+        true_positives = len(selected)
+        counts = np.zeros((pairs.num_gt_ids, pairs.num_track_ids))
+        np.add.at(counts, (pairs.pair_gt_id[selected], pairs.pair_track_id[selected]), 1)
+        association = counts / np.maximum(1, gt_id_counts + track_id_counts - counts)
+        det = true_positives / (num_gt + num_tracks - true_positives)
+        ass = float((counts * association).sum()) / max(1, true_positives)
+        hota.append(np.sqrt(det * ass))
+        deta.append(det)
+        assa.append(ass)
+        loca.append(float(pairs.iou[selected].sum()) / max(1, true_positives) if true_positives else 1.0)
+
+    return {"hota": float(np.mean(hota)), "deta": float(np.mean(deta)),
+            "assa": float(np.mean(assa)), "loca": float(np.mean(loca))}
+
+
+def ball_metrics(gt, tracks, ball_margin=5.0):
+    """Ball hit rate over the frames with a ground truth ball, and how many tracked balls were hits."""
+    num_frames = max(len(gt), len(tracks))
+    gt_balls = np.full((num_frames, 4), np.nan, dtype=np.float32)
+    mask = gt.kind == BALL
+    # with more than one ball in a frame, the last one is used
+    gt_balls[gt.frame_index[mask]] = gt.bbox[mask]
+    balls = np.full((num_frames, 4), np.nan, dtype=np.float32)
+    balls[:len(tracks)] = tracks.ball_boxes()
+
+    gt_found, found = ~np.isnan(gt_balls[:, 0]), ~np.isnan(balls[:, 0])
+    centres = (balls[:, :2] + balls[:, 2:]) / 2
+    with np.errstate(invalid="ignore"):
+        inside = ((centres >= gt_balls[:, :2] - ball_margin) & (centres <= gt_balls[:, 2:] + ball_margin)).all(axis=1)
+    hits = gt_found & found & inside
+    gt_centres = (gt_balls[:, :2] + gt_balls[:, 2:]) / 2
+    errors = np.linalg.norm(centres[gt_found & found] - gt_centres[gt_found & found], axis=1)
+    return {
+        "hit_rate": float(hits.sum() / max(1, gt_found.sum())),
+        "precision": float(hits.sum() / max(1, found.sum())),
+        "gt_frames": int(gt_found.sum()),
+        "tracked_frames": int(found.sum()),
+        "false_frames": int((found & ~gt_found).sum()),
+        "median_error_px": float(np.median(errors)) if len(errors) else None,
+    }
+
+
+def evaluate_tracks(gt, tracks, iou_threshold=0.5, ball_margin=5.0):
+    """
+    Scores a TrackStore against ground truth from `load_mot_gt`. Ground truth past the last tracked
+    frame is ignored, so a run over the first N frames is compared with the first N frames only.
+    """
+    if len(gt) > len(tracks):
+        end = gt.offsets[len(tracks)]
+        gt = TrackStore(gt.offsets[:len(tracks) + 1], gt.frame_index[:end], gt.track_id[:end],
+                        gt.kind[:end], gt.bbox[:end])
+    pairs = FramePairs(gt, tracks, PLAYER)
+    players = {**clear_metrics(pairs, iou_threshold), **identity_metrics(pairs, iou_threshold), **hota_metrics(pairs)}
+    players.update(gt_boxes=len(pairs.gt_frame), gt_ids=pairs.num_gt_ids, track_ids=pairs.num_track_ids)
+    return {"frames": len(tracks), "players": players, "ball": ball_metrics(gt, tracks, ball_margin)}
+
+
+def evaluate_sequence(sequence_dir, tracks, **kwargs):
+    """Scores `tracks` (a TrackStore or a saved one) against `sequence_dir`/gt/gt.txt."""
+    if isinstance(tracks, str):
+        tracks = TrackStore.load(tracks)
+    gt = load_mot_gt(os.path.join(sequence_dir, "gt", "gt.txt"))
+    return evaluate_tracks(gt, tracks, **kwargs)
+
+
+def find_gt(input_path):
+    """Returns the MOT sequence folder of a .../<sequence>/img1 frame folder if it has gt/gt.txt, else None."""
+    sequence_dir = os.path.dirname(os.path.abspath(input_path.rstrip("/\\")))
+    return sequence_dir if os.path.exists(os.path.join(sequence_dir, "gt", "gt.txt")) else None
+
+
+def print_scores(name, scores):
+    players, ball = scores["players"], scores["ball"]
+    print(f"{name}: {scores['frames']} frames\n"
+          f"  players  MOTA {players['mota']:.3f}  MOTP {players['motp']:.3f}  IDF1 {players['idf1']:.3f}  "
+          f"HOTA {players['hota']:.3f} (DetA {players['deta']:.3f}, AssA {players['assa']:.3f})  "
+          f"FP {players['fp']}  FN {players['fn']}  IDSW {players['id_switches']}\n"
+          f"  ball     hit rate {ball['hit_rate']:.3f}  precision {ball['precision']:.3f}  "
+          f"false frames {ball['false_frames']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score tracker output against MOTChallenge ground truth.")
+    parser.add_argument("sequence_dir", help="sequence folder holding gt/gt.txt and gt/labels.txt")
+    parser.add_argument("tracks", nargs="+", help="tracks.npz files (or .npy store folders) to score")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU threshold for MOTA and IDF1")
+    parser.add_argument("--ball-margin", type=float, default=5.0, help="px the ground truth ball box is grown by")
+    args = parser.parse_args()
+
+    gt = load_mot_gt(os.path.join(args.sequence_dir, "gt", "gt.txt"))
+    for path in args.tracks:
+        print_scores(path, evaluate_tracks(gt, TrackStore.load(path), args.iou, args.ball_margin))
@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+
+'''
+Sparse optical flow for moving detections between detector runs.
+
+Each box is sampled with a small grid of points that are followed with pyramidal Lucas-Kanade
+from one frame to the next and back again. Points whose forward-backward error is above
+`max_error` px are discarded, and a box moves by the median displacement of its remaining points.
+Flow runs on a grayscale copy downscaled by `scale`; boxes and displacements are in full-frame pixels.
+'''
+
+GRID = np.linspace(0.2, 0.8, 3)
+THUMBNAIL_SIZE = (64, 36)
+LK_PARAMS = dict(winSize=(15, 15), maxLevel=3, criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+
+class FlowFrame:
+    """A frame prepared for flow: the downscaled grayscale image and a tiny thumbnail for cut detection."""
+
+    def __init__(self, frame, scale=0.5):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self.scale = scale
+        self.gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale != 1 else gray
+        self.thumbnail = cv2.resize(self.gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    def difference(self, other):
+        """Mean absolute thumbnail difference (0-255); large values mean a camera cut."""
+        return float(np.abs(self.thumbnail - other.thumbnail).mean())
+
+
+def propagate_boxes(previous, current, boxes, min_points=3, max_error=1.0):
+    """
+    Moves (n, 4) xyxy `boxes` from FlowFrame `previous` to `current`. Returns the moved boxes, a
+    boolean mask of the boxes that could be followed, and the median displacement length over
+    all followed points (the overall scene motion) in px.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if len(boxes) == 0:
+        return boxes, np.zeros(0, dtype=bool), 0.0
+
+    xs = boxes[:, [0]] + (boxes[:, [2]] - boxes[:, [0]]) * np.tile(GRID, len(GRID))
+    ys = boxes[:, [1]] + (boxes[:, [3]] - boxes[:, [1]]) * np.repeat(GRID, len(GRID))
+    points = (np.stack([xs, ys], axis=-1).reshape(-1, 1, 2) * previous.scale).astype(np.float32)
+
+    moved, status, _ = cv2.calcOpticalFlowPyrLK(previous.gray, current.gray, points, None, **LK_PARAMS)
+    back, back_status, _ = cv2.calcOpticalFlowPyrLK(current.gray, previous.gray, moved, None, **LK_PARAMS)
+    error = np.linalg.norm(back - points, axis=-1).ravel() / previous.scale
+    valid = (status.ravel() == 1) & (back_status.ravel() == 1) & (error < max_error)
+
+    displacement = ((moved - points).reshape(len(boxes), -1, 2)) / previous.scale
+    valid = valid.reshape(len(boxes), -1)
+    followed = valid.sum(axis=1) >= min_points
+
+    shifts = np.zeros((len(boxes), 2), dtype=np.float32)
+    for index in np.flatnonzero(followed):
+        shifts[index] = np.median(displacement[index][valid[index]], axis=0)
+
+    scene_motion = float(np.median(np.linalg.norm(displacement[valid], axis=-1))) if valid.any() else 0.0
+    return boxes + np.tile(shifts, 2), followed, scene_motion
@@ -1,8 +1,11 @@
 import os
+import cv2
 from ultralytics import YOLO
+from detection_metrics import evaluate, print_metrics
 from config import (
     PROJECT_DIR,
-    TEST_IMAGE_PATH
+    TEST_IMAGE_PATH,
+    TEST_LABEL_PATH
 )
 
 '''
@@ -10,40 +13,57 @@ This script runs object detection predictions and evaluation on a test image set
 
 Steps:
 1. Loads the trained model from a specified .pt file.
-2. Runs predictions on the test image directory and saves results (images + labels).
-3. Evaluates the model using the test set defined in a YOLO-compatible data YAML file.
+2. Runs predictions once on the test image directory, saving every box down to EVAL_CONF with its
+   confidence as YOLO txt labels, and the images annotated with the boxes above CONF_THRESHOLD.
+   NMS runs at model.val's IoU of EVAL_IOU (0.7) for both, so the images keep a few more overlapping
+   boxes than with the previous IoU of 0.5.
+3. Evaluates the saved labels against the test labels with detection_metrics, so no second inference pass is needed.
 4. Prints key evaluation metrics (mAP, precision, recall).
+
+The saved labels can be re-scored at any threshold without the model:
+python detection_metrics.py <OUTPUT_DIR>/test_predictions/labels <TEST_LABEL_PATH> --conf 0.25
 '''
 
 # Paths
 MODEL_PATH = os.path.join(PROJECT_DIR, 'src', 'runs', 'soccer_training', 'exp_full_train', 'weights', 'best.pt')
 OUTPUT_DIR = os.path.join(PROJECT_DIR, 'predictions', 'test')
-DATA_YAML_PATH = os.path.join("..", "yolo_config.yaml")
 
 # Load model
 model = YOLO(MODEL_PATH)
 
 CONF_THRESHOLD = 0.25
-IOU_THRESHOLD = 0.5
+# mAP needs the low-confidence boxes as well, and the NMS IoU of model.val, so the metrics match it
+EVAL_CONF = 0.001
+EVAL_IOU = 0.7
 RUN_NAME = "test_predictions"
 
+run_dir = os.path.join(OUTPUT_DIR, RUN_NAME)
+label_dir = os.path.join(run_dir, "labels")
+os.makedirs(run_dir, exist_ok=True)
+# save_txt appends to existing files, so clear the labels of a previous run
+if os.path.isdir(label_dir):
+    for name in os.listdir(label_dir):
+        os.remove(os.path.join(label_dir, name))
+
 results = model.predict(
     source=TEST_IMAGE_PATH,
-    save=True,
+    stream=True,
     save_txt=True,
-    conf=CONF_THRESHOLD,
-    iou=IOU_THRESHOLD,
+    save_conf=True,
+    conf=EVAL_CONF,
+    iou=EVAL_IOU,
     project=OUTPUT_DIR,
     name=RUN_NAME,
     exist_ok=True
 )
 
-print(f"Predictions saved to: {os.path.join(OUTPUT_DIR, 'test_predictions')}")
+for result in results:
+    confident = result[result.boxes.conf.cpu().numpy() >= CONF_THRESHOLD]
+    cv2.imwrite(os.path.join(run_dir, os.path.basename(result.path)), confident.plot())
+
+print(f"Predictions saved to: {run_dir}")
 
 # Evaluate
-metrics = model.val(data=DATA_YAML_PATH, split="test")
+metrics = evaluate(label_dir, TEST_LABEL_PATH)
 print("\n--- Evaluation Results on Test Set ---")
-print(f"mAP50: {metrics.box.map50:.3f}")
-print(f"mAP50-95: {metrics.box.map:.3f}")
-print(f"Precision: {metrics.box.precision:.3f}")
-print(f"Recall: {metrics.box.recall:.3f}")
+print_metrics(metrics, model.names)
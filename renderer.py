@@ -0,0 +1,97 @@
+import numpy as np
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from utils.image_utils import draw_tracks
+
+'''
+Parallel annotation renderer.
+
+Frames are copied into a ring of shared-memory slots, worker processes draw the tracks
+directly into those slots and the result is copied back into the caller's frame. Only
+the slot number and the small per-frame track arrays are pickled, never the pixels, so
+drawing a long 1080p sequence scales with the number of cores.
+'''
+
+_worker_memory = None
+_worker_buffer = None
+
+
+def _attach(name, shape, slots):
+    global _worker_memory, _worker_buffer
+    _worker_memory = shared_memory.SharedMemory(name=name)
+    _worker_buffer = np.ndarray((slots,) + shape, dtype=np.uint8, buffer=_worker_memory.buf)
+
+
+def _draw_slot(slot, player_ids, player_boxes, ball_bbox):
+    draw_tracks(_worker_buffer[slot], player_ids, player_boxes, ball_bbox)
+
+
+class ParallelRenderer:
+    def __init__(self, workers=4, slots=None):
+        self.workers = workers
+        self.slots = slots or 2 * workers
+        self.shape = None
+        self.memory = None
+        self.buffer = None
+        self.pool = None
+        self.free = deque(range(self.slots))
+
+    def render(self, tracked):
+        """
+        Draws a (frame, FrameTracks) stream in place and yields the pairs in order. Up to `slots`
+        frames are in flight, so the input may be a generator such as `Tracker.track_frames`.
+        """
+        pending = deque()
+        for frame, frame_tracks in tracked:
+            if self.pool is None:
+                self._start(frame.shape)
+            elif frame.shape != self.shape:
+                raise ValueError(f"Frame shape {frame.shape} differs from {self.shape}")
+
+            if not self.free:
+                yield self._finish(pending.popleft())
+
+            slot = self.free.popleft()
+            self.buffer[slot] = frame
+            future = self.pool.submit(_draw_slot, slot, *frame_tracks)
+            pending.append((slot, future, frame, frame_tracks))
+
+        while pending:
+            yield self._finish(pending.popleft())
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+        if self.memory is not None:
+            self.buffer = None
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _start(self, shape):
+        self.shape = tuple(shape)
+        self.memory = shared_memory.SharedMemory(create=True, size=self.slots * int(np.prod(self.shape)))
+        self.buffer = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=self.memory.buf)
+        # spawn rather than fork: the caller usually has decode and encode threads running
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_attach,
+            initargs=(self.memory.name, self.shape, self.slots)
+        )
+
+    def _finish(self, item):
+        slot, future, frame, frame_tracks = item
+        future.result()
+        frame[...] = self.buffer[slot]
+        self.free.append(slot)
+        return frame, frame_tracks
@@ -1,58 +1,284 @@
 import os
+import json
+import time
+import numpy as np
+from itertools import tee
 from tracker import Tracker
-from utils.image_utils import save_image
-from utils.dataset_utils import load_frames
+from track_cache import TrackCache
+from detection_store import DetectionStore
+from track_store import TrackStore
+from metrics import Metrics, TIME_BUCKETS
+from utils.dataset_utils import load_frames, open_frames, load_detector_frames, list_source_files, get_source_fps, VideoSink, LiveSource
 from config import PROJECT_DIR
 
 '''
-Runs object tracking on a sequence of image frames using two YOLO models:
+Runs object tracking on a sequence of image frames or a video file using two YOLO models:
 one for general object detection (e.g., players) and one specifically for tracking the ball.
 
 Steps:
-1. Loads all frames from a specified input directory.
+1. Loads all frames from a specified input directory or video file.
 2. Initializes the Tracker class with two model weights.
-3. Computes object tracks, optionally loading from a cached track file.
+3. Computes object tracks, optionally loading them from the content-addressed track cache.
 4. Interpolates ball positions to improve continuity.
 5. Draws annotations (e.g., bounding boxes and IDs) on each frame.
-6. Saves the annotated frames to an output directory.
+6. Writes the annotated frames straight into a video, optionally also saving them as images.
+
+Raw detections are written to DETECTIONS_PATH so tracker settings can be re-tuned with
+`Tracker.retrack_from_detections` without running the models again.
 
 Output:
-- Annotated frames saved to specified output directory.
+- Annotated video saved to OUTPUT_VIDEO_PATH.
+- With SAVE_FRAMES, annotated frames saved to OUTPUT_DIR as well.
+
+With STREAMING enabled, frames are decoded, tracked, drawn and saved one batch at a time
+and released once written, so peak memory does not grow with sequence length. The ball is
+interpolated with a bounded lag of INTERPOLATION_LAG frames in this mode.
+
+Annotations are drawn in place on the decoded frames. Setting RENDER_WORKERS spreads the
+drawing over a process pool that shares frame buffers instead of pickling them; drawing
+costs only about a millisecond per frame, so this pays off mainly with heavier overlays.
+
+If a frame store was built for INPUT_PATH (see create_frame_store.py), frames are read from
+its memory-mapped arrays instead of being decoded, and its DETECTOR_IMGSZ copy is fed to the
+detector.
+
+BACKEND selects how the models run: "torch", or "onnx" / "onnx-int8" for ONNX Runtime on
+CPU-only machines; the ONNX export is made once and cached next to the weights.
+With LIVE enabled, LIVE_SOURCE (a camera index, a stream URL, or a video file or frame folder
+played back at its real frame rate) is tracked as frames arrive. Each frame has a latency budget
+of LIVE_LATENCY_BUDGET s (one frame interval by default). Frames behind budget are tracked with
+optical flow instead of the models, the ball fallback is skipped once the budget is spent and
+frames arriving while the tracker is busy are dropped. Tracks are appended to LIVE_TRACKS_PATH
+as JSON lines as they are produced, and the end-to-end latency and drop counts are reported.
+
+With DETECT_STRIDE > 1 the models only run on every DETECT_STRIDE-th frame (or earlier on cuts
+and fast motion) and tracks are moved with optical flow in between.
+
+Decoding runs READ_WORKERS threads ahead of the detector and encoding is handed to
+background threads, so I/O overlaps with inference.
+
+Both models are loaded on first use, so a run served from the track cache never loads them and
+the ball model only loads once the fallback is needed. WARMUP loads and runs both before the first
+frame instead, which live mode always does. The time spent importing, loading weights and on the
+first inference of each model is printed at the end (and recorded as startup_* metrics).
+
+With METRICS enabled, per-stage timings (primary and ball model, ByteTrack, encoding),
+the fallback rate, the number of active tracks and the throughput of the run are appended
+to METRICS_JSONL_PATH and written to METRICS_PROM_PATH in Prometheus text format.
 '''
 
 
-INPUT_DIR = os.path.join(PROJECT_DIR, 'data', 'data', '4_annotate_1min_bodo_start', 'img1')
+INPUT_PATH = os.path.join(PROJECT_DIR, 'data', 'data', '4_annotate_1min_bodo_start', 'img1')
 OUTPUT_DIR = os.path.join(PROJECT_DIR, 'frames_output')
+OUTPUT_VIDEO_PATH = os.path.join(PROJECT_DIR, 'tracked_video.mp4')
 BEST_MODEL_PATH = os.path.join(PROJECT_DIR, "src", "runs", "soccer_training", "ball_and_player", "weights", "best.pt")
 BALL_MODEL_PATH = os.path.join(PROJECT_DIR, "src", "runs", "soccer_training", "only_ball", "weights", "best.pt")
-CACHE_PATH = os.path.join(PROJECT_DIR, "output", "tracks.pkl")
+CACHE_DIR = os.path.join(PROJECT_DIR, "output", "track_cache")
+DETECTIONS_PATH = os.path.join(PROJECT_DIR, "output", "detections.npz")
+STREAMING = True
+DETECTOR_IMGSZ = 1024
+BACKEND = "torch"
+DETECT_STRIDE = 1
+WARMUP = False
+SAVE_FRAMES = False
+INTERPOLATION_LAG = 10
+READ_WORKERS = 4
+READ_QUEUE_SIZE = 32
+WRITE_WORKERS = 2
+WRITE_QUEUE_SIZE = 16
+RENDER_WORKERS = 0
+LIVE = False
+LIVE_SOURCE = INPUT_PATH
+LIVE_LATENCY_BUDGET = None
+LIVE_TRACKS_PATH = os.path.join(PROJECT_DIR, "output", "live_tracks.jsonl")
+METRICS = True
+METRICS_JSONL_PATH = os.path.join(PROJECT_DIR, "output", "metrics.jsonl")
+METRICS_PROM_PATH = os.path.join(PROJECT_DIR, "output", "tracker.prom")
 
 
 def run_tracker_on_frames():
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-    frames, filenames = load_frames(INPUT_DIR)
+    frames, filenames = load_frames(INPUT_PATH, workers=READ_WORKERS)
     if not frames:
         print("No frames loaded. Exiting.")
         return
 
-    tracker = Tracker(model_path=BEST_MODEL_PATH, ball_model_path=BALL_MODEL_PATH)
+    metrics = Metrics(enabled=METRICS)
+    tracker = Tracker(model_path=BEST_MODEL_PATH, ball_model_path=BALL_MODEL_PATH, metrics=metrics,
+                      backend=BACKEND, detect_stride=DETECT_STRIDE)
+    if WARMUP:
+        tracker.warmup()
 
     tracks = tracker.get_object_tracks(
         frames,
         use_cache=True,
-        cache_path=CACHE_PATH
+        cache_dir=CACHE_DIR,
+        source_files=list_source_files(INPUT_PATH),
+        detections_path=DETECTIONS_PATH,
+        detector_frames=load_detector_frames(INPUT_PATH, DETECTOR_IMGSZ)
+    )
+
+    with metrics.timer("interpolate"):
+        tracks = tracker.interpolate_ball_positions(tracks)
+    with metrics.timer("draw"):
+        annotated_frames = tracker.draw_annotations(frames, tracks, in_place=True, workers=RENDER_WORKERS)
+
+    with _open_sink(INPUT_PATH, OUTPUT_VIDEO_PATH, OUTPUT_DIR if SAVE_FRAMES else None, metrics) as sink:
+        for index, frame in enumerate(annotated_frames):
+            sink.write(frame, os.path.basename(filenames[index]))
+
+    _report_startup(tracker)
+    _write_metrics(metrics, INPUT_PATH)
+
+    print(f"Tracking complete. Annotated video saved to: {OUTPUT_VIDEO_PATH}")
+
+
+def run_tracker_streaming():
+    metrics = Metrics(enabled=METRICS)
+    tracker = Tracker(model_path=BEST_MODEL_PATH, ball_model_path=BALL_MODEL_PATH, metrics=metrics,
+                      backend=BACKEND, detect_stride=DETECT_STRIDE)
+    if WARMUP:
+        tracker.warmup()
+
+    count, _ = track_sequence(tracker, INPUT_PATH, OUTPUT_VIDEO_PATH, OUTPUT_DIR if SAVE_FRAMES else None, DETECTIONS_PATH)
+    if count == 0:
+        print("No frames loaded. Exiting.")
+        return
+
+    _report_startup(tracker)
+    _write_metrics(metrics, INPUT_PATH)
+    print(f"Tracking complete. {count} annotated frames saved to: {OUTPUT_VIDEO_PATH}")
+
+
+def run_tracker_live():
+    metrics = Metrics(enabled=METRICS)
+    tracker = Tracker(model_path=BEST_MODEL_PATH, ball_model_path=BALL_MODEL_PATH, metrics=metrics,
+                      backend=BACKEND)
+    # the first frames would otherwise blow their latency budget on loading the models
+    tracker.warmup()
+    os.makedirs(os.path.dirname(LIVE_TRACKS_PATH), exist_ok=True)
+
+    latencies = []
+    with LiveSource(LIVE_SOURCE) as source, open(LIVE_TRACKS_PATH, "w") as tracks_file, \
+            VideoSink(OUTPUT_VIDEO_PATH, fps=source.fps or 25, queue_size=WRITE_QUEUE_SIZE, metrics=metrics) as sink:
+        latency_budget = LIVE_LATENCY_BUDGET or 1 / (source.fps or 25)
+        print(f"Live tracking {LIVE_SOURCE} with a latency budget of {latency_budget * 1000:.0f} ms")
+        for capture_time, frame, frame_tracks in tracker.track_live(source, latency_budget):
+            sink.write(tracker.annotate_frame(frame, frame_tracks))
+            _write_live_tracks(tracks_file, len(latencies), capture_time, frame_tracks)
+            latencies.append(time.perf_counter() - capture_time)
+            metrics.observe("live_latency_seconds", latencies[-1], TIME_BUCKETS)
+
+    if not latencies:
+        print("No frames received. Exiting.")
+        return
+
+    metrics.count("live_dropped", source.dropped)
+    _report_startup(tracker)
+    _write_metrics(metrics, LIVE_SOURCE)
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+    print(f"Live tracking complete. {len(latencies)} of {source.captured} frames processed, {source.dropped} dropped; "
+          f"latency p50 {p50:.0f} ms, p95 {p95:.0f} ms, max {max(latencies) * 1000:.0f} ms. "
+          f"Video saved to: {OUTPUT_VIDEO_PATH}")
+
+
+def _write_live_tracks(tracks_file, index, capture_time, frame_tracks):
+    """Appends one frame's tracks as a JSON line and flushes it, so the file can be followed live."""
+    tracks_file.write(json.dumps({
+        "frame": index,
+        "capture_time": capture_time,
+        "players": {int(track_id): box.tolist() for track_id, box in zip(frame_tracks.player_ids, frame_tracks.player_boxes)},
+        "ball": frame_tracks.ball_bbox.tolist() if frame_tracks.ball_bbox is not None else None,
+    }) + "\n")
+    tracks_file.flush()
+
+
+def track_sequence(tracker, input_path, output_video_path, frames_dir=None, detections_path=None):
+    """
+    Streams one frame folder or video through `tracker` into `output_video_path`, using the track
+    cache when possible. Returns the number of frames written and the uninterpolated TrackStore.
+    """
+    metrics = tracker.metrics
+    detector_frames = load_detector_frames(input_path, DETECTOR_IMGSZ)
+
+    cache = TrackCache(CACHE_DIR)
+    cache_key = tracker.cache_key(source_files=list_source_files(input_path), prescaled=detector_frames is not None)
+    cached_tracks = cache.load(cache_key)
+
+    named_frames, frames = tee(open_frames(input_path, READ_WORKERS, READ_QUEUE_SIZE))
+    frames = (frame for _, frame in frames)
+    detection_store = DetectionStore()
+    raw_tracks = []
+    if cached_tracks is not None:
+        tracked = zip(frames, cached_tracks)
+    else:
+        tracked = _record_tracks(
+            tracker.track_frames(frames, detection_store=detection_store, detector_frames=detector_frames), raw_tracks)
+    tracked = tracker.interpolate_stream(tracked, INTERPOLATION_LAG)
+    tracked = tracker.render_stream(tracked, RENDER_WORKERS)
+
+    count = 0
+    with _open_sink(input_path, output_video_path, frames_dir, metrics) as sink:
+        for (filename, _), (frame, _) in zip(named_frames, tracked):
+            sink.write(frame, os.path.basename(filename))
+            count += 1
+
+    if count == 0:
+        return 0, None
+
+    if cached_tracks is not None:
+        # the tracker never saw these frames, so count them here for the throughput
+        metrics.count("frames", count)
+        metrics.count("cache_hits")
+        return count, cached_tracks
+
+    tracks = TrackStore.from_frames(raw_tracks)
+    cache.save(cache_key, tracks)
+    if detections_path:
+        detection_store.save(detections_path)
+    metrics.count("cache_misses")
+    return count, tracks
+
+
+def _open_sink(input_path, output_video_path, frames_dir, metrics=None):
+    return VideoSink(
+        output_video_path,
+        fps=get_source_fps(input_path),
+        frames_dir=frames_dir,
+        queue_size=WRITE_QUEUE_SIZE,
+        dump_workers=WRITE_WORKERS,
+        metrics=metrics
     )
 
-    tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
-    annotated_frames = tracker.draw_annotations(frames, tracks)
 
-    for index, frame in enumerate(annotated_frames):
-        filename = os.path.basename(filenames[index])
-        save_image(frame, OUTPUT_DIR, filename)
+def _report_startup(tracker):
+    if not tracker.startup:
+        print("Startup: models not loaded")
+        return
+    print("Startup: " + ", ".join(f"{phase.replace('_', ' ')} {seconds:.2f}s" for phase, seconds in tracker.startup.items()))
+
+
+def _write_metrics(metrics, source):
+    if not metrics.enabled:
+        return
+    metrics.write_jsonl(METRICS_JSONL_PATH, input=source)
+    metrics.write_prometheus(METRICS_PROM_PATH, input=source)
+    snapshot = metrics.snapshot()
+    if "fps" in snapshot:
+        print(f"{snapshot['counters']['frames']} frames at {snapshot['fps']:.1f} fps, "
+              f"fallback rate {snapshot['fallback_rate']:.1%}")
+
 
-    print(f"Tracking complete. Annotated frames saved to: {OUTPUT_DIR}")
+def _record_tracks(tracked, raw_tracks):
+    """Passes a (frame, FrameTracks) stream through, keeping the uninterpolated tracks for the cache."""
+    for frame, frame_tracks in tracked:
+        raw_tracks.append(frame_tracks)
+        yield frame, frame_tracks
 
 
 if __name__ == "__main__":
-    run_tracker_on_frames()
+    if LIVE:
+        run_tracker_live()
+    elif STREAMING:
+        run_tracker_streaming()
+    else:
+        run_tracker_on_frames()
@@ -0,0 +1,214 @@
+import os
+import sys
+import glob
+import json
+import time
+import multiprocessing
+import cv2
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from natsort import natsorted
+from tracker import Tracker
+from metrics import Metrics
+from detector_backend import export_onnx
+from mot_metrics import evaluate_sequence, find_gt
+from run_tracker import track_sequence, BEST_MODEL_PATH, BALL_MODEL_PATH, BACKEND, DETECT_STRIDE
+from utils.dataset_utils import is_video_file, list_frame_files
+from config import PROJECT_DIR
+
+'''
+Tracks many sequences in one job, spread over a pool of worker processes.
+
+Each worker loads both YOLO models at most once, when first needed, and keeps its own `Tracker`,
+whose ByteTrack state is reset before every sequence, so a pool of WORKERS processes tracks WORKERS
+sequences at a time. Torch and OpenCV in each worker are limited to THREADS_PER_WORKER intra-op
+threads so the workers do not oversubscribe the cores. As every worker holds its own pair of models,
+there is by default one worker per group of THREADS_PER_WORKER cores, and at most MAX_WORKERS.
+A sequence that fails is recorded as failed and the rest of the batch goes on. Each worker is given
+one sequence at a time, so when a worker process dies (a segfault or an OOM kill) only the sequences
+in flight at that moment are recorded as failed, and the ones not started yet go to a new pool.
+The longest sequences are submitted first to keep all workers busy towards the end of the job.
+run_tracker.BACKEND and DETECT_STRIDE apply here too; ONNX exports are made up front, before the workers start.
+
+Sequences are frame folders or video files, given as paths or glob patterns on the command line
+or in SEQUENCES. The track cache in run_tracker.CACHE_DIR is shared between workers.
+
+Output, per sequence in OUTPUT_ROOT/<sequence name>:
+- tracked_video.mp4 with the annotated frames (and frames/ with SAVE_FRAMES)
+- tracks.npz with the uninterpolated tracks (see `TrackStore.load`)
+- detections.npz with the raw detections, when they were not served from the cache
+- summary.json with status, frame count, timings and metrics of the run, plus its accuracy
+  (see mot_metrics) when the sequence has gt/gt.txt
+and OUTPUT_ROOT/batch_summary.json collecting all of them.
+
+Usage:
+python run_tracker_batch.py "data/data/*/img1" match.mp4
+'''
+
+
+SEQUENCES = [os.path.join(PROJECT_DIR, 'data', 'data', '*', 'img1')]
+OUTPUT_ROOT = os.path.join(PROJECT_DIR, 'output', 'batch')
+THREADS_PER_WORKER = 4
+MAX_WORKERS = 4
+WORKERS = max(1, min(MAX_WORKERS, (os.cpu_count() or 1) // THREADS_PER_WORKER))
+SAVE_FRAMES = False
+
+_tracker = None
+
+
+def find_sequences(patterns):
+    sequences = []
+    for pattern in patterns:
+        matches = natsorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        sequences.extend(match for match in matches if match not in sequences)
+    return sequences
+
+
+def sequence_name(path):
+    """`<name>` for .../<name>/img1 folders and <name>.mp4 videos, otherwise the folder name."""
+    path = path.rstrip("/\\")
+    if is_video_file(path):
+        return os.path.splitext(os.path.basename(path))[0]
+    name = os.path.basename(path)
+    return os.path.basename(os.path.dirname(path)) if name == "img1" else name
+
+
+def run_batch(sequences, output_root=OUTPUT_ROOT, workers=WORKERS, threads=THREADS_PER_WORKER):
+    # inherited by the spawned workers, so OpenMP sizes its pool before torch is imported there
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.makedirs(output_root, exist_ok=True)
+    if BACKEND != "torch":
+        for weights_path in (BEST_MODEL_PATH, BALL_MODEL_PATH):
+            export_onnx(weights_path, quantize=BACKEND == "onnx-int8")
+
+    jobs = []
+    names = set()
+    for path in sorted(sequences, key=_sequence_length, reverse=True):
+        name = sequence_name(path)
+        while name in names:
+            name += "_"
+        names.add(name)
+        jobs.append((path, os.path.join(output_root, name)))
+
+    start = time.perf_counter()
+    summaries = []
+    queue = deque(jobs)
+    pool_size = min(workers, len(jobs)) or 1
+    context = multiprocessing.get_context("spawn")
+
+    def record(summary):
+        summaries.append(summary)
+        print(f"[{len(summaries)}/{len(jobs)}] {summary['sequence']}: {summary['status']}, "
+              f"{summary.get('frames', 0)} frames in {summary['seconds']:.1f}s")
+
+    while queue:
+        with ProcessPoolExecutor(
+            max_workers=pool_size,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(BEST_MODEL_PATH, BALL_MODEL_PATH, BACKEND, DETECT_STRIDE, threads)
+        ) as pool:
+            # at most one queued sequence per worker, so a broken pool only takes the ones in flight with it
+            running = {}
+            while queue or running:
+                while queue and len(running) < pool_size:
+                    path, output_dir = queue.popleft()
+                    running[pool.submit(_track_one, path, output_dir)] = (path, output_dir)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    try:
+                        record(future.result())
+                    except Exception as e:
+                        # the worker died, so it could not write a summary itself
+                        broken = broken or isinstance(e, BrokenProcessPool)
+                        record(_failed_summary(*running[future], e))
+                    del running[future]
+                if broken:
+                    for future in as_completed(running):
+                        record(_failed_summary(*running[future], future.exception()))
+                    break
+        if queue:
+            print(f"A worker process died, restarting the pool for the {len(queue)} remaining sequences.")
+
+    elapsed = time.perf_counter() - start
+    total_frames = sum(summary.get("frames", 0) for summary in summaries)
+    batch_summary = {
+        "sequences": len(jobs),
+        "failed": sum(summary["status"] != "ok" for summary in summaries),
+        "workers": workers,
+        "threads_per_worker": threads,
+        "frames": total_frames,
+        "seconds": elapsed,
+        "fps": total_frames / elapsed if elapsed > 0 else None,
+        "runs": natsorted(summaries, key=lambda summary: summary["sequence"]),
+    }
+    with open(os.path.join(output_root, "batch_summary.json"), "w") as f:
+        json.dump(batch_summary, f, indent=2)
+    return batch_summary
+
+
+def _failed_summary(input_path, output_dir, error):
+    return {"sequence": os.path.basename(output_dir), "input": input_path, "status": "failed",
+            "error": f"{type(error).__name__}: {error}", "seconds": 0.0}
+
+
+def _sequence_length(path):
+    if is_video_file(path):
+        capture = cv2.VideoCapture(path)
+        length = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        capture.release()
+        return length
+    return len(list_frame_files(path)) if os.path.isdir(path) else 0
+
+
+def _init_worker(model_path, ball_model_path, backend, detect_stride, threads):
+    global _tracker
+    import torch
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+    _tracker = Tracker(model_path=model_path, ball_model_path=ball_model_path, backend=backend,
+                       detect_stride=detect_stride)
+
+
+def _track_one(input_path, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    _tracker.reset()
+    _tracker.metrics = Metrics()
+    summary = {"sequence": os.path.basename(output_dir), "input": input_path, "worker": os.getpid()}
+
+    start = time.perf_counter()
+    try:
+        count, tracks = track_sequence(
+            _tracker,
+            input_path,
+            os.path.join(output_dir, "tracked_video.mp4"),
+            os.path.join(output_dir, "frames") if SAVE_FRAMES else None,
+            os.path.join(output_dir, "detections.npz")
+        )
+        if tracks is not None:
+            tracks.save(os.path.join(output_dir, "tracks.npz"))
+            gt_dir = find_gt(input_path) if not is_video_file(input_path) else None
+            if gt_dir:
+                summary["accuracy"] = evaluate_sequence(gt_dir, tracks)
+        summary.update(status="ok" if count else "empty", frames=count)
+    except Exception as e:
+        summary.update(status="failed", error=f"{type(e).__name__}: {e}")
+    summary["seconds"] = time.perf_counter() - start
+    summary["metrics"] = _tracker.metrics.snapshot()
+
+    with open(os.path.join(output_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    sequences = find_sequences(sys.argv[1:] or SEQUENCES)
+    if not sequences:
+        print("No sequences found. Exiting.")
+        sys.exit(1)
+
+    result = run_batch(sequences)
+    print(f"Batch complete. {result['frames']} frames from {result['sequences']} sequences "
+          f"({result['failed']} failed) at {result['fps']:.1f} fps, summaries in {OUTPUT_ROOT}")
@@ -0,0 +1,86 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+import mot_metrics
+from track_store import TrackStore, FrameTracks, PLAYER
+
+'''
+Checks `mot_metrics.clear_metrics` against a per-timestep port of TrackEval's CLEAR loop.
+
+Run with: python -m pytest test_mot_metrics.py
+'''
+
+
+def reference_clear(frames, iou_threshold=0.5):
+    """TrackEval's CLEAR matching over [(gt [(id, box)], tracks [(id, box)])] per timestep."""
+    previous, last_matched = {}, {}
+    tp = fp = fn = switches = 0
+    for gts, tracks in frames:
+        # like TrackEval, a timestep without ground truth or tracks leaves the previous matches alone
+        if not gts or not tracks:
+            fp += len(tracks)
+            fn += len(gts)
+            continue
+        iou = mot_metrics.pairwise_iou(
+            np.repeat([box for _, box in gts], len(tracks), axis=0),
+            np.tile([box for _, box in tracks], (len(gts), 1))
+        ).reshape(len(gts), len(tracks))
+        score = np.where(iou >= iou_threshold - mot_metrics.EPS, iou, 0.0)
+        score += 1000 * (score > 0) * np.array([[previous.get(g) == t for t, _ in tracks] for g, _ in gts])
+        rows, columns = linear_sum_assignment(-score)
+        matched = score[rows, columns] > 0
+        previous = {}
+        for row, column in zip(rows[matched], columns[matched]):
+            gt_id, track_id = gts[row][0], tracks[column][0]
+            switches += gt_id in last_matched and last_matched[gt_id] != track_id
+            previous[gt_id] = last_matched[gt_id] = track_id
+        tp += int(matched.sum())
+        fp += len(tracks) - int(matched.sum())
+        fn += len(gts) - int(matched.sum())
+    return {"tp": tp, "fp": fp, "fn": fn, "id_switches": switches}
+
+
+def score(tmp_path, frames):
+    lines = [f"{t + 1},{gt_id + 1},{x1},{y1},{x2 - x1},{y2 - y1},1,1,1"
+             for t, (gts, _) in enumerate(frames) for gt_id, (x1, y1, x2, y2) in gts]
+    (tmp_path / "gt.txt").write_text("\n".join(lines) + "\n")
+    (tmp_path / "labels.txt").write_text("player\n")
+    gt = mot_metrics.load_mot_gt(str(tmp_path / "gt.txt"), str(tmp_path / "labels.txt"), num_frames=len(frames))
+    tracks = TrackStore.from_frames(
+        FrameTracks(np.array([i for i, _ in ts], np.int32), np.array([b for _, b in ts], np.float32).reshape(-1, 4), None)
+        for _, ts in frames)
+    metrics = mot_metrics.clear_metrics(mot_metrics.FramePairs(gt, tracks, PLAYER))
+    return {key: metrics[key] for key in ("tp", "fp", "fn", "id_switches")}
+
+
+def random_sequence(seed, length=80, objects=8):
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform(0, 1500, (objects, 2))
+    frames = []
+    for t in range(length):
+        positions += rng.normal(0, 8, positions.shape)
+        no_gt, no_tracks = rng.random() < 0.1, rng.random() < 0.1
+        gts, tracks = [], []
+        for i, (x, y) in enumerate(positions):
+            box = np.array([x, y, x + 60, y + 60], np.float32)
+            if not no_gt and rng.random() < 0.85:
+                gts.append((i, box))
+            if not no_tracks and rng.random() < 0.85:
+                tracks.append((i + 100 if rng.random() > 0.1 else i + 200, box + rng.normal(0, 12, 4).astype(np.float32)))
+        frames.append((gts, tracks))
+    return frames
+
+
+def test_matches_reference_on_sequences_with_gaps(tmp_path):
+    for seed in range(20):
+        frames = random_sequence(seed)
+        assert score(tmp_path, frames) == reference_clear(frames), seed
+
+
+def test_match_survives_frame_without_ground_truth(tmp_path):
+    box = np.array([0, 0, 100, 100], np.float32)
+    frames = [
+        ([(0, box)], [(10, box)]),
+        ([], [(10, box)]),
+        ([(0, box)], [(10, box + [0, 0, 0, -40]), (20, box + [0, 0, 0, -5])]),
+    ]
+    assert score(tmp_path, frames) == reference_clear(frames) == {"tp": 2, "fp": 2, "fn": 0, "id_switches": 0}
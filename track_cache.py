@@ -0,0 +1,102 @@
+import os
+import json
+import hashlib
+import numpy as np
+from track_store import TrackStore
+
+'''
+Content-addressed cache for tracking results.
+
+Each entry is a TrackStore saved as <key>.npz in the cache directory, where the key is a hash of the input
+sequence, both model weight files and every tracker parameter that affects the output. Changing
+any of them therefore misses the cache instead of serving stale tracks, while switching back to
+an earlier configuration or clip is an instant hit. Entries are evicted least-recently-used
+first once the directory grows beyond `max_bytes`.
+'''
+
+_weights_fingerprints = {}
+
+
+def fingerprint_files(paths):
+    """Fingerprints a frame sequence by path, size and modification time of every file."""
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def fingerprint_frames(frames):
+    """Fingerprints in-memory frames by their pixel content."""
+    digest = hashlib.blake2b(digest_size=16)
+    for frame in frames:
+        digest.update(str(frame.shape).encode())
+        digest.update(np.ascontiguousarray(frame))
+    return digest.hexdigest()
+
+
+def fingerprint_weights(path):
+    """Hashes a weight file's content, memoised per (path, size, mtime) so it is read once per process."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _weights_fingerprints:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+        _weights_fingerprints[memo_key] = digest.hexdigest()
+    return _weights_fingerprints[memo_key]
+
+
+def make_cache_key(**parts):
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class TrackCache:
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def load(self, key):
+        path = self._entry_path(key)
+        try:
+            os.utime(path)  # mark as recently used
+            return TrackStore.load(path)
+        except OSError:
+            # missing, or evicted by another process sharing the cache since
+            return None
+
+    def save(self, key, tracks):
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        tracks.save(tmp_path)
+        os.replace(tmp_path, path)
+        self._evict(keep=path)
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _evict(self, keep):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npz") and ".tmp" not in name:
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # evicted meanwhile by another process sharing the cache
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
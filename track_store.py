@@ -0,0 +1,125 @@
+import os
+import numpy as np
+from collections import namedtuple
+
+'''
+Columnar, array-backed storage for tracking results.
+
+All tracked objects of a sequence live in four flat arrays (frame index, track id, kind and
+xyxy bbox) sorted by frame, plus an offsets array so the rows of frame i are
+offsets[i]:offsets[i + 1]. Per-frame access is a slice view, per-track access is a boolean
+mask, and the whole store saves to a single .npz file or to a directory of .npy files that
+can be memory-mapped.
+'''
+
+PLAYER = 0
+BALL = 1
+BALL_TRACK_ID = 1
+FIELDS = ("offsets", "frame_index", "track_id", "kind", "bbox")
+
+FrameTracks = namedtuple("FrameTracks", ["player_ids", "player_boxes", "ball_bbox"])
+
+
+class TrackStore:
+    def __init__(self, offsets, frame_index, track_id, kind, bbox):
+        self.offsets = offsets
+        self.frame_index = frame_index
+        self.track_id = track_id
+        self.kind = kind
+        self.bbox = bbox
+
+    @classmethod
+    def from_frames(cls, frames):
+        """Builds a store from an iterable of FrameTracks."""
+        counts, track_ids, kinds, boxes = [], [], [], []
+        for player_ids, player_boxes, ball_bbox in frames:
+            player_ids = np.asarray(player_ids, dtype=np.int32)
+            track_ids.append(player_ids)
+            kinds.append(np.full(len(player_ids), PLAYER, dtype=np.int8))
+            boxes.append(np.asarray(player_boxes, dtype=np.float32).reshape(-1, 4))
+            if ball_bbox is not None:
+                track_ids.append(np.array([BALL_TRACK_ID], dtype=np.int32))
+                kinds.append(np.array([BALL], dtype=np.int8))
+                boxes.append(np.asarray(ball_bbox, dtype=np.float32).reshape(1, 4))
+            counts.append(len(player_ids) + (ball_bbox is not None))
+
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+        return cls(
+            offsets,
+            np.repeat(np.arange(len(counts), dtype=np.int32), counts),
+            np.concatenate(track_ids) if track_ids else np.empty(0, np.int32),
+            np.concatenate(kinds) if kinds else np.empty(0, np.int8),
+            np.concatenate(boxes) if boxes else np.empty((0, 4), np.float32)
+        )
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        rows = slice(self.offsets[index], self.offsets[index + 1])
+        kind, track_id, bbox = self.kind[rows], self.track_id[rows], self.bbox[rows]
+        players = kind == PLAYER
+        ball = np.flatnonzero(kind == BALL)
+        return FrameTracks(track_id[players], bbox[players], bbox[ball[0]] if len(ball) else None)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def track(self, track_id, kind=PLAYER):
+        """Returns (frame_index, bbox) arrays for one track over the whole sequence."""
+        mask = (self.track_id == track_id) & (self.kind == kind)
+        return self.frame_index[mask], self.bbox[mask]
+
+    def ball_boxes(self):
+        """Returns a (frames, 4) array of ball boxes with NaN rows where no ball was tracked."""
+        boxes = np.full((len(self), 4), np.nan, dtype=np.float32)
+        mask = self.kind == BALL
+        boxes[self.frame_index[mask]] = self.bbox[mask]
+        return boxes
+
+    def with_ball_boxes(self, ball_boxes):
+        """Returns a copy whose ball rows are replaced by `ball_boxes`; NaN rows mean no ball."""
+        players = self.kind == PLAYER
+        has_ball = ~np.isnan(ball_boxes).any(axis=1)
+
+        frame_index = np.concatenate([self.frame_index[players], np.flatnonzero(has_ball).astype(np.int32)])
+        order = np.argsort(frame_index, kind="stable")
+        counts = np.bincount(frame_index, minlength=len(self))
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+
+        return TrackStore(
+            offsets,
+            frame_index[order],
+            np.concatenate([self.track_id[players], np.full(has_ball.sum(), BALL_TRACK_ID, dtype=np.int32)])[order],
+            np.concatenate([self.kind[players], np.full(has_ball.sum(), BALL, dtype=np.int8)])[order],
+            np.concatenate([self.bbox[players], ball_boxes[has_ball].astype(np.float32)])[order]
+        )
+
+    def to_dict(self):
+        """Converts to the legacy {"players": [...], "ball": [...]} list-of-dicts structure."""
+        tracks = {"players": [], "ball": []}
+        for player_ids, player_boxes, ball_bbox in self:
+            tracks["players"].append({int(i): {"bbox": bbox.tolist()} for i, bbox in zip(player_ids, player_boxes)})
+            tracks["ball"].append({} if ball_bbox is None else {BALL_TRACK_ID: {"bbox": ball_bbox.tolist()}})
+        return tracks
+
+    def save(self, path):
+        """Saves to a single .npz file, or to a directory of .npy files if `path` has no .npz suffix."""
+        arrays = {field: getattr(self, field) for field in FIELDS}
+        if path.endswith(".npz"):
+            np.savez(path, **arrays)
+            return
+        os.makedirs(path, exist_ok=True)
+        for field, array in arrays.items():
+            np.save(os.path.join(path, f"{field}.npy"), array)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """Loads a store; a .npy directory can be memory-mapped with e.g. mmap_mode="r"."""
+        if path.endswith(".npz"):
+            with np.load(path) as data:
+                return cls(*(data[field] for field in FIELDS))
+        return cls(*(np.load(os.path.join(path, f"{field}.npy"), mmap_mode=mmap_mode) for field in FIELDS))
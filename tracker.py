@@ -1,10 +1,18 @@
-from ultralytics import YOLO
-import supervision as sv
-import pickle
 import os
+import time
 import numpy as np
-import pandas as pd
-from utils.image_utils import get_center_of_bbox, draw_ellipse, draw_triangle
+from collections import deque
+from itertools import islice
+from track_cache import TrackCache, fingerprint_files, fingerprint_frames, fingerprint_weights, make_cache_key
+from detection_store import DetectionStore
+from track_store import TrackStore, FrameTracks
+from interpolation import interpolate_boxes, StreamingInterpolator
+from renderer import ParallelRenderer
+from metrics import NULL_METRICS, TIME_BUCKETS
+from detector_backend import load_detector, import_backend
+from motion import FlowFrame, propagate_boxes
+from utils.dataset_utils import open_frames, list_source_files
+from utils.image_utils import get_center_of_bbox, get_search_window, get_tile_windows, draw_tracks
 
 '''
 This module defines the `Tracker` class for detecting and tracking football players and the ball
@@ -12,111 +20,656 @@ in a sequence of video frames using two YOLO models (one for players, one for th
 
 Key features:
 - Batch detection of frames using YOLO
+- Streaming tracking over a frame generator, frame folder or video file with bounded memory
 - Player tracking using ByteTrack
 - Ball detection with fallback logic and scoring
-- Position interpolation for smoother ball tracking
-- Drawing of annotated frames
-- Caching of tracking results to avoid redundant computation
+- Batched fallback ball detection over all frames the primary model missed
+- Region-of-interest fallback around the last or predicted ball position
+- Tiled (SAHI-style) small-object fallback with cross-tile NMS
+- Vectorized and bounded-lag streaming ball interpolation
+- Drawing of annotated frames, in place or across a process pool
+- Columnar, array-backed track storage (see `track_store`)
+- Content-addressed caching of tracking results to avoid redundant computation
+- Raw detection store and re-tracking from it without running either model
+- Detection stride with optical-flow propagation and motion-triggered re-detection
+- Live, latency-bounded tracking of real-time sources
+- PyTorch, ONNX Runtime or INT8-quantized ONNX detector backends (see `detector_backend`)
+- Optional per-stage timers, counters and histograms (see `metrics`)
+- Lazy loading: supervision, ultralytics and torch are imported and the models loaded on first use,
+  so a cached run never loads them; `warmup` front-loads all of it, and the time of each startup
+  phase (import, weight load, first inference) is kept in `startup`
 '''
 
+
+class BallState:
+    """Last known ball position, its velocity in px per frame and the number of frames since it was seen."""
+
+    def __init__(self):
+        self.position = None
+        self.velocity = (0.0, 0.0)
+        self.misses = 0
+
+    def predict(self):
+        return [p + v * (self.misses + 1) for p, v in zip(self.position, self.velocity)]
+
+    def update(self, bbox):
+        """Advances the state by one frame and returns the ball bbox for it as an array, or None."""
+        if bbox is None:
+            self.misses += 1
+            return None
+
+        position = get_center_of_bbox(bbox)
+        if self.position is not None:
+            self.velocity = tuple((p - q) / (self.misses + 1) for p, q in zip(position, self.position))
+        self.position = position
+        self.misses = 0
+        return np.asarray(bbox, dtype=np.float32)
+
+
 class Tracker:
-    def __init__(self, model_path, ball_model_path, conf_thresh=0.3, iou_thresh=0.5):
-        self.model = YOLO(model_path)
-        self.model_ball = YOLO(ball_model_path)
-        self.tracker = sv.ByteTrack()
+    def __init__(self, model_path, ball_model_path, conf_thresh=0.3, iou_thresh=0.5,
+                 batch_fallback=True, fallback_batch_size=8,
+                 fallback_mode="full", roi_size=640, roi_growth=160, roi_max_misses=5,
+                 tile_size=640, tile_overlap=0.2, tile_batch_size=32,
+                 bytetrack_params=None, ball_confidence_weight=0.6, detector_imgsz=1024,
+                 metrics=None, backend="torch", detect_stride=1, redetect_cut=40.0, redetect_motion=25.0,
+                 redetect_lost=0.3, flow_scale=0.5, ball_tta=None):
+        self.model_path = model_path
+        self.ball_model_path = ball_model_path
+        # "torch", "onnx" or "onnx-int8"; already constructed models (anything with a YOLO-style
+        # `predict`) are used as they are
+        self.backend = backend
+        # test-time augmentation for the full-frame and ROI ball fallback, which only the torch backend has;
+        # None uses it wherever the backend supports it
+        self.ball_tta = backend == "torch" and (ball_tta is None or bool(ball_tta))
+        if ball_tta and backend != "torch":
+            print(f"Note: the {backend} backend has no test-time augmentation, the ball fallback runs without it")
+        # weights paths are loaded on first use, see the `model` and `model_ball` properties
+        self._model = None if isinstance(model_path, (str, os.PathLike)) else model_path
+        self._model_ball = None if isinstance(ball_model_path, (str, os.PathLike)) else ball_model_path
+        self.bytetrack_params = bytetrack_params or {}
+        self._tracker = None
         self.conf_thresh = conf_thresh
         self.iou_thresh = iou_thresh
+        self.detector_imgsz = detector_imgsz
+        self.batch_fallback = batch_fallback
+        self.fallback_batch_size = fallback_batch_size
+        # "full" scans the whole frame with the ball model, "roi" searches a window around the
+        # last or predicted ball position and only scans the full frame after roi_max_misses misses,
+        # "tiled" runs the ball model on overlapping native-resolution tiles
+        self.fallback_mode = fallback_mode
+        self.roi_size = roi_size
+        self.roi_growth = roi_growth
+        self.roi_max_misses = roi_max_misses
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.tile_batch_size = tile_batch_size
+        # the remaining weight of the ball score goes to closeness to the last ball position
+        self.ball_confidence_weight = ball_confidence_weight
+        # with detect_stride > 1 both models run on every detect_stride-th frame only, and players and
+        # ball are moved along with sparse optical flow in between. A detection is forced earlier on a
+        # camera cut (mean thumbnail difference above redetect_cut), fast scene motion (median flow
+        # above redetect_motion px) or when more than redetect_lost of the players cannot be followed
+        self.detect_stride = detect_stride
+        self.redetect_cut = redetect_cut
+        self.redetect_motion = redetect_motion
+        self.redetect_lost = redetect_lost
+        self.flow_scale = flow_scale
+        # a `metrics.Metrics` to record stage timings and counters into; off by default
+        self.metrics = metrics or NULL_METRICS
+        # seconds spent per startup phase: import, load_model, load_ball_model, first_inference, first_ball_inference
+        self.startup = {}
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self._load_model(self.model_path, "load_model")
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    @property
+    def model_ball(self):
+        if self._model_ball is None:
+            self._model_ball = self._load_model(self.ball_model_path, "load_ball_model")
+        return self._model_ball
+
+    @model_ball.setter
+    def model_ball(self, model):
+        self._model_ball = model
+
+    @property
+    def tracker(self):
+        if self._tracker is None:
+            import supervision as sv
+            self._tracker = sv.ByteTrack(**self.bytetrack_params)
+        return self._tracker
+
+    def reset(self):
+        """Starts a fresh ByteTrack state, e.g. before tracking another sequence."""
+        self._tracker = None
+
+    def warmup(self, ball=True):
+        """
+        Loads the models and runs each once on a blank frame, so the first real frame pays for neither
+        (e.g. before live tracking). Without `ball` the ball model is left to load on first use.
+        Returns `startup`.
+        """
+        import supervision  # noqa: F401, not imported by `_load_model` when the models were passed in
+        blank = np.zeros((self.detector_imgsz, self.detector_imgsz, 3), dtype=np.uint8)
+        self._predict(self.model, "first_inference", source=[blank], imgsz=self.detector_imgsz)
+        if ball:
+            imgsz = {"roi": self.roi_size, "tiled": self.tile_size}.get(self.fallback_mode, 1920)
+            self._predict(self.model_ball, "first_ball_inference", source=[blank], imgsz=imgsz)
+        return self.startup
+
+    def _load_model(self, weights_path, phase):
+        start = time.perf_counter()
+        import supervision  # noqa: F401, every detection goes through it
+        import_backend()
+        self._record_startup("import", start)
+        start = time.perf_counter()
+        model = load_detector(weights_path, self.backend)
+        self._record_startup(phase, start)
+        return model
+
+    def _predict(self, model, phase, **kwargs):
+        """`model.predict`, timed as the startup `phase` the first time."""
+        if phase in self.startup:
+            return model.predict(**kwargs)
+        start = time.perf_counter()
+        results = model.predict(**kwargs)
+        self._record_startup(phase, start)
+        return results
+
+    def _record_startup(self, phase, start):
+        seconds = time.perf_counter() - start
+        self.startup[phase] = self.startup.get(phase, 0.0) + seconds
+        self.metrics.observe(f"startup_{phase}_seconds", seconds, TIME_BUCKETS)
 
     def detect_frames(self, frames, batch_size=20):
         detections = []
         for i in range(0, len(frames), batch_size):
-            batch = self.model.predict(
-                source=frames[i:i+batch_size],
-                conf=self.conf_thresh,
-                iou=self.iou_thresh,
-                imgsz=1024,
-                classes=[1]
-            )
-            detections.extend(batch)
+            detections.extend(self._detect_batch(frames[i:i+batch_size]))
         return detections
 
-    def get_object_tracks(self, frames, use_cache=False, cache_path=None, max_ball_distance=150):
-        if use_cache and cache_path and os.path.exists(cache_path):
-            return self._load_cached_tracks(cache_path)
+    def track_frames(self, frames, max_ball_distance=150, batch_size=20, detection_store=None, detector_frames=None):
+        """
+        Tracks players and the ball over any iterable of frames, e.g. a generator from
+        `iter_frames`, or over a frame folder or video file path. Yields (frame, FrameTracks) per frame and only keeps
+        one detection batch alive, so memory stays flat regardless of sequence length.
+        Raw detections are appended to `detection_store` if one is given. `detector_frames` may hold
+        the same frames pre-resized for the detector (see `load_detector_frames`); boxes are scaled back.
+        """
+        import supervision as sv
+        if isinstance(frames, (str, os.PathLike)):
+            frames = (frame for _, frame in open_frames(os.fspath(frames)))
+        frames = iter(frames)
+        detector_frames = iter(detector_frames) if detector_frames is not None else None
+        if self.detect_stride > 1:
+            yield from self._track_frames_strided(frames, max_ball_distance, detection_store, detector_frames)
+            return
 
-        detections = self.detect_frames(frames)
-        tracks = {"players": [], "ball": []}
-        last_ball_position = None
+        ball = BallState()
+        batch_fallback = self.batch_fallback and self.fallback_mode != "roi"
 
-        for index, detection in enumerate(detections):
-            player_class_id, ball_class_id = self._get_class_ids(detection.names)
+        while True:
+            batch = list(islice(frames, batch_size))
+            if not batch:
+                break
 
-            supervision_detections = sv.Detections.from_ultralytics(detection)
-            player_tracks = self.tracker.update_with_detections(supervision_detections)
+            detector_batch = list(islice(detector_frames, len(batch))) if detector_frames is not None else batch
+            results = self._detect_batch(detector_batch)
+            names = results[0].names
+            detections = [
+                self._scale_detections(sv.Detections.from_ultralytics(result), frame, detector_frame)
+                for result, frame, detector_frame in zip(results, batch, detector_batch)
+            ]
+            del results, detector_batch
+            if detection_store is not None and detection_store.names is None:
+                detection_store.names = names
+
+            states = [self._update_players(frame_detections, names) for frame_detections in detections]
+            fallback_candidates = self._batch_fallback_candidates(batch, states) if batch_fallback else {}
+
+            for index, ((player_ids, player_boxes), candidates, ball_class_id) in enumerate(states):
+                frame = batch[index]
+                batch[index] = None
+
+                best_ball_bbox = self._select_best_ball_bbox(candidates, ball_class_id, ball.position, max_ball_distance)
+                fallback = None
+                if best_ball_bbox is None:
+                    self.metrics.count("fallback_frames")
+                    if index in fallback_candidates:
+                        fallback = fallback_candidates.pop(index)
+                    else:
+                        fallback = self._frame_fallback_candidates(frame, ball_class_id, ball)
+                    best_ball_bbox = self._select_best_ball_bbox(fallback, ball_class_id, ball.position, max_ball_distance)
+
+                if detection_store is not None:
+                    detection_store.append(detections[index], fallback)
+                detections[index] = None
+
+                self.metrics.count("frames")
+                if best_ball_bbox is not None:
+                    self.metrics.count("ball_frames")
+                yield frame, FrameTracks(player_ids, player_boxes, ball.update(best_ball_bbox))
+
+    def _track_frames_strided(self, frames, max_ball_distance, detection_store, detector_frames):
+        """
+        `track_frames` with a detection stride: keyframes go through the models as usual, frames in
+        between reuse the previous frame's detections moved by optical flow, so ByteTrack keeps its
+        IDs. Detections are made frame by frame as whether the next frame is a keyframe depends on it.
+        """
+        ball = BallState()
+        names = None
+        previous = None
+        since_detection = 0
+
+        for frame in frames:
+            detector_frame = next(detector_frames) if detector_frames is not None else frame
+            flow_frame = FlowFrame(frame, self.flow_scale)
+            propagated = None
+            if previous is not None and since_detection < self.detect_stride:
+                propagated = self._propagate(previous, flow_frame)
+
+            fallback = None
+            if propagated is None:
+                self.metrics.count("keyframes")
+                names, detections, (player_ids, player_boxes), best_ball_bbox, fallback = self._track_keyframe(
+                    frame, detector_frame, ball, max_ball_distance)
+                if detection_store is not None and detection_store.names is None:
+                    detection_store.names = names
+                since_detection = 1
+            else:
+                detections, best_ball_bbox = propagated
+                (player_ids, player_boxes), _, _ = self._update_players(detections, names)
+                since_detection += 1
+
+            if detection_store is not None:
+                detection_store.append(detections, fallback, propagated=propagated is not None, ball_bbox=best_ball_bbox)
+
+            self.metrics.count("frames")
+            if best_ball_bbox is not None:
+                self.metrics.count("ball_frames")
+            ball_bbox = ball.update(best_ball_bbox)
+            previous = (flow_frame, detections, ball_bbox)
+            yield frame, FrameTracks(player_ids, player_boxes, ball_bbox)
+
+    def track_live(self, frames, latency_budget=0.04, max_ball_distance=150, max_propagated=5):
+        """
+        Tracks a live stream of (capture_time, frame) pairs, e.g. a `LiveSource`, one frame at a time
+        and yields (capture_time, frame, FrameTracks) as soon as each frame is done. capture_time is
+        a time.perf_counter() value. When running the models (at their recent average cost) would
+        finish the frame later than `latency_budget` s after capture, its tracks are moved by optical
+        flow from the previous frame instead, at most `max_propagated` frames in a row. The ball
+        model fallback is skipped once the budget is spent. Frames arriving while the tracker is
+        busy are dropped by the source.
+        """
+        ball = BallState()
+        names = None
+        previous = None
+        propagated_in_row = 0
+        keyframe_cost = 0.0
+
+        for capture_time, frame in frames:
+            flow_frame = FlowFrame(frame, self.flow_scale)
+            propagated = None
+            if (previous is not None and propagated_in_row < max_propagated
+                    and time.perf_counter() - capture_time + keyframe_cost > latency_budget):
+                propagated = self._propagate(previous, flow_frame)
+
+            if propagated is None:
+                start = time.perf_counter()
+                names, detections, (player_ids, player_boxes), best_ball_bbox, _ = self._track_keyframe(
+                    frame, frame, ball, max_ball_distance, fallback_deadline=capture_time + latency_budget)
+                # moving average, so one slow frame does not switch the detector off for long
+                keyframe_cost = 0.8 * keyframe_cost + 0.2 * (time.perf_counter() - start) if keyframe_cost else time.perf_counter() - start
+                propagated_in_row = 0
+            else:
+                self.metrics.count("live_propagated")
+                detections, best_ball_bbox = propagated
+                (player_ids, player_boxes), _, _ = self._update_players(detections, names)
+                propagated_in_row += 1
+
+            self.metrics.count("frames")
+            if best_ball_bbox is not None:
+                self.metrics.count("ball_frames")
+            ball_bbox = ball.update(best_ball_bbox)
+            previous = (flow_frame, detections, ball_bbox)
+            self.metrics.observe("live_tracking_latency_seconds", time.perf_counter() - capture_time, TIME_BUCKETS)
+            yield capture_time, frame, FrameTracks(player_ids, player_boxes, ball_bbox)
+
+    def _track_keyframe(self, frame, detector_frame, ball, max_ball_distance, fallback_deadline=None):
+        """
+        Runs the primary model and ByteTrack on one frame and picks its ball, asking the ball model
+        when the primary model has none, unless time.perf_counter() is already past `fallback_deadline`.
+        Returns the class names, the detections, the player tracks, the ball bbox and the fallback
+        candidates (None if not run).
+        """
+        import supervision as sv
+        result = self._detect_batch([detector_frame])[0]
+        detections = self._scale_detections(sv.Detections.from_ultralytics(result), frame, detector_frame)
+        player_tracks, candidates, ball_class_id = self._update_players(detections, result.names)
+
+        fallback = None
+        best_ball_bbox = self._select_best_ball_bbox(candidates, ball_class_id, ball.position, max_ball_distance)
+        if best_ball_bbox is None and fallback_deadline is not None and time.perf_counter() > fallback_deadline:
+            self.metrics.count("skipped_fallback_frames")
+        elif best_ball_bbox is None:
+            self.metrics.count("fallback_frames")
+            fallback = self._frame_fallback_candidates(frame, ball_class_id, ball)
+            best_ball_bbox = self._select_best_ball_bbox(fallback, ball_class_id, ball.position, max_ball_distance)
+        return result.names, detections, player_tracks, best_ball_bbox, fallback
+
+    def _propagate(self, previous, flow_frame):
+        """
+        Moves the previous frame's detections and ball to this frame, or returns None when a
+        re-detection is due: on a cut, on fast scene motion or when too many players are lost.
+        """
+        previous_flow_frame, detections, ball_bbox = previous
+        if flow_frame.difference(previous_flow_frame) > self.redetect_cut:
+            self.metrics.count("redetect_cut")
+            return None
+
+        boxes = detections.xyxy if ball_bbox is None else np.vstack([detections.xyxy, ball_bbox[None]])
+        if len(boxes) == 0:
+            return None
+        with self.metrics.timer("optical_flow"):
+            moved, followed, scene_motion = propagate_boxes(previous_flow_frame, flow_frame, boxes)
+
+        if scene_motion > self.redetect_motion:
+            self.metrics.count("redetect_motion")
+            return None
+        players_followed = followed[:len(detections)]
+        if len(detections) and 1 - players_followed.mean() > self.redetect_lost:
+            self.metrics.count("redetect_lost")
+            return None
 
-            tracks["players"].append(self._extract_tracks(player_tracks, player_class_id))
-            tracks["ball"].append({})
+        propagated = detections[players_followed]
+        propagated.xyxy = moved[:len(detections)][players_followed]
+        if ball_bbox is not None and followed[-1]:
+            return propagated, moved[-1]
+        return propagated, None
 
-            best_ball_bbox = self._get_best_ball_bbox(supervision_detections, player_tracks, ball_class_id, last_ball_position, max_ball_distance)
+    def retrack_from_detections(self, detection_store, max_ball_distance=150, skip_propagated=False):
+        """
+        Replays ByteTrack and ball selection over a DetectionStore (or a path to one) without running
+        either model, so tracker settings can be swept quickly. Primary detections are re-filtered by
+        `conf_thresh`; frames where the fallback model never ran get no fallback candidates.
+        Propagated frames of a strided run replay their flow-moved boxes and ball as the run used
+        them, never as ball candidates; with `skip_propagated` they get no tracks and ByteTrack only sees keyframes.
+        """
+        if isinstance(detection_store, (str, os.PathLike)):
+            detection_store = DetectionStore.load(detection_store)
 
+        self.reset()
+        ball = BallState()
+        frame_tracks = []
+
+        for index in range(len(detection_store)):
+            propagated = detection_store.is_propagated(index)
+            if propagated and skip_propagated:
+                frame_tracks.append(FrameTracks(np.empty(0, np.int32), np.empty((0, 4), np.float32), ball.update(None)))
+                continue
+
+            detections = detection_store.primary(index)
+            detections = detections[detections.confidence >= self.conf_thresh]
+            (player_ids, player_boxes), candidates, ball_class_id = self._update_players(detections, detection_store.names)
+            if propagated:
+                frame_tracks.append(FrameTracks(player_ids, player_boxes, ball.update(detection_store.propagated_ball(index))))
+                continue
+
+            best_ball_bbox = self._select_best_ball_bbox(candidates, ball_class_id, ball.position, max_ball_distance)
             if best_ball_bbox is None:
-                best_ball_bbox = self._fallback_ball_detection(frames[index], ball_class_id, last_ball_position, max_ball_distance)
+                fallback = detection_store.fallback(index) or []
+                best_ball_bbox = self._select_best_ball_bbox(fallback, ball_class_id, ball.position, max_ball_distance)
+
+            frame_tracks.append(FrameTracks(player_ids, player_boxes, ball.update(best_ball_bbox)))
+
+        return TrackStore.from_frames(frame_tracks)
+
+    def get_object_tracks(self, frames, use_cache=False, cache_dir=None, max_ball_distance=150, source_files=None,
+                          detections_path=None, detector_frames=None):
+        """
+        Returns the tracks for `frames`. With a `cache_dir`, results are stored under a key derived from
+        the input sequence (`source_files` if given, otherwise the frame pixels), both weight files and
+        the tracker parameters, so a changed input or setting never returns stale tracks.
+        `frames` may also be a frame folder or video file path.
+        With `detections_path`, the raw detections are saved there for `retrack_from_detections`.
+        Caching a one-shot iterable of frames needs `source_files`, as fingerprinting would use it up.
+        """
+        if isinstance(frames, (str, os.PathLike)) and source_files is None:
+            source_files = list_source_files(os.fspath(frames))
+        cache = TrackCache(cache_dir) if cache_dir else None
+        key = self.cache_key(frames, source_files, max_ball_distance, detector_frames is not None) if cache else None
+        if use_cache and cache:
+            tracks = cache.load(key)
+            if tracks is not None:
+                self.metrics.count("frames", len(tracks))
+                return tracks
 
-            if best_ball_bbox:
-                tracks["ball"][index][1] = {"bbox": best_ball_bbox}
-                last_ball_position = get_center_of_bbox(best_ball_bbox)
+        detection_store = DetectionStore() if detections_path else None
+        tracks = TrackStore.from_frames(
+            frame_tracks for _, frame_tracks in self.track_frames(
+                frames, max_ball_distance, detection_store=detection_store, detector_frames=detector_frames))
 
-        if cache_path:
-            self._save_cached_tracks(tracks, cache_path)
+        if detection_store is not None:
+            detection_store.save(detections_path)
+        if cache:
+            cache.save(key, tracks)
 
         return tracks
 
-    def interpolate_ball_positions(self, ball_tracks):
-        boxes = [frame.get(1, {}).get('bbox', []) for frame in ball_tracks]
-        dataframe = pd.DataFrame(boxes, columns=['x1', 'y1', 'x2', 'y2'])
-        dataframe = dataframe.interpolate().bfill()
-        return [{1: {"bbox": row.tolist()}} for _, row in dataframe.iterrows()]
-
-    def draw_annotations(self, frames, tracks):
-        annotated_frames = []
-        for index, frame in enumerate(frames):
-            image = frame.copy()
-            for track_id, player in tracks["players"][index].items():
-                image = draw_ellipse(image, player["bbox"], (0, 0, 255), track_id)
-            for track_id, ball in tracks["ball"][index].items():
-                image = draw_triangle(image, ball["bbox"], (0, 255, 0))
-            annotated_frames.append(image)
-        return annotated_frames
+    def cache_key(self, frames=None, source_files=None, max_ball_distance=150, prescaled=False):
+        if source_files is None and not hasattr(frames, "__len__"):
+            raise ValueError("Fingerprinting would consume this frame iterator; pass source_files or a frame sequence")
+        if not isinstance(self.model_path, (str, os.PathLike)) or not isinstance(self.ball_model_path, (str, os.PathLike)):
+            raise ValueError("Caching tracks needs the weights paths of both models, not model objects")
+        sequence = fingerprint_files(source_files) if source_files is not None else fingerprint_frames(frames)
+        return make_cache_key(
+            sequence=sequence,
+            model=fingerprint_weights(self.model_path),
+            ball_model=fingerprint_weights(self.ball_model_path),
+            params=self._output_params(max_ball_distance),
+            prescaled=prescaled
+        )
+
+    def interpolate_ball_positions(self, tracks, max_gap=None):
+        """Returns a copy of the TrackStore with missing ball positions filled by linear interpolation."""
+        return tracks.with_ball_boxes(interpolate_boxes(tracks.ball_boxes(), max_gap))
+
+    def interpolate_stream(self, tracked, lag=10, max_gap=None):
+        """
+        Interpolates the ball inside a (frame, FrameTracks) stream such as `track_frames`. Each frame is
+        yielded once `lag` later frames have been seen, so at most lag + 1 frames are held back.
+        """
+        interpolator = StreamingInterpolator(lag, max_gap)
+        pending = deque()
+        for item in tracked:
+            pending.append(item)
+            for _, box in interpolator.push(item[1].ball_bbox):
+                frame, frame_tracks = pending.popleft()
+                yield frame, frame_tracks._replace(ball_bbox=box)
+
+        for _, box in interpolator.flush():
+            frame, frame_tracks = pending.popleft()
+            yield frame, frame_tracks._replace(ball_bbox=box)
+
+    def draw_annotations(self, frames, tracks, in_place=False, workers=0):
+        """
+        Returns annotated frames. With `in_place` the given frames are drawn on instead of copies
+        (read-only ones, e.g. from a frame store, are still copied), and with `workers` > 0 the
+        drawing is spread over a process pool through shared memory.
+        """
+        targets = [frame if in_place and frame.flags.writeable else frame.copy() for frame in frames]
+        if workers > 0:
+            with ParallelRenderer(workers) as renderer:
+                for _ in renderer.render(zip(targets, tracks)):
+                    pass
+            return targets
+        return [self.annotate_frame(frame, tracks[index]) for index, frame in enumerate(targets)]
+
+    def render_stream(self, tracked, workers=0):
+        """Draws a (frame, FrameTracks) stream in place, on the calling thread or across `workers` processes."""
+        if workers <= 0:
+            for frame, frame_tracks in tracked:
+                yield self.annotate_frame(frame, frame_tracks), frame_tracks
+            return
+        with ParallelRenderer(workers) as renderer:
+            yield from renderer.render(tracked)
+
+    def annotate_frame(self, frame, frame_tracks):
+        """Draws the tracks for a single frame in place."""
+        return draw_tracks(frame, *frame_tracks)
+
+    def _detect_batch(self, frames):
+        with self.metrics.timer("primary_predict"):
+            return self._predict(
+                self.model,
+                "first_inference",
+                source=frames,
+                conf=self.conf_thresh,
+                iou=self.iou_thresh,
+                imgsz=self.detector_imgsz,
+                classes=[1]
+            )
+
+    def _scale_detections(self, detections, frame, detector_frame):
+        if detector_frame is frame or detector_frame.shape[1] == frame.shape[1]:
+            return detections
+        detections.xyxy = (detections.xyxy * (frame.shape[1] / detector_frame.shape[1])).astype(np.float32)
+        return detections
+
+    def _update_players(self, supervision_detections, class_name_mapping):
+        player_class_id, ball_class_id = self._get_class_ids(class_name_mapping)
+
+        with self.metrics.timer("bytetrack_update"):
+            player_tracks = self.tracker.update_with_detections(supervision_detections)
+        self.metrics.observe("active_tracks", len(player_tracks))
+
+        candidates = list(zip(supervision_detections.xyxy, supervision_detections.class_id, supervision_detections.confidence)) + \
+                     list(zip(player_tracks.xyxy, player_tracks.class_id, player_tracks.confidence))
+
+        return self._extract_tracks(player_tracks, player_class_id), candidates, ball_class_id
+
+    def _frame_fallback_candidates(self, frame, ball_class_id, ball):
+        """Ball model candidates for a single frame, searched around the ball first in "roi" mode."""
+        if self.fallback_mode == "roi" and ball.position is not None and ball.misses < self.roi_max_misses:
+            return self._roi_ball_candidates(frame, ball_class_id, ball.position, ball.predict(), ball.misses)
+        return self._fallback_ball_candidates([frame], ball_class_id)[0]
+
+    def _batch_fallback_candidates(self, frames, states):
+        """
+        Runs the ball model once over every frame in the batch without a primary ball detection.
+        Whether a frame misses does not depend on the last ball position, so the scoring can be
+        replayed frame by frame afterwards with the same result as the per-frame fallback.
+        """
+        misses = [
+            index for index, (_, candidates, ball_class_id) in enumerate(states)
+            if not any(class_id == ball_class_id for _, class_id, _ in candidates)
+        ]
+        if not misses:
+            return {}
+
+        ball_class_id = states[misses[0]][2]
+        results = self._fallback_ball_candidates([frames[index] for index in misses], ball_class_id)
+        return dict(zip(misses, results))
 
     def _get_class_ids(self, class_name_mapping):
         inverse_mapping = {v: k for k, v in class_name_mapping.items()}
         return inverse_mapping["player"], inverse_mapping["ball"]
 
     def _extract_tracks(self, tracked_objects, target_class_id):
-        return {
-            track_id: {"bbox": bbox.tolist()}
-            for bbox, class_id, track_id in zip(tracked_objects.xyxy, tracked_objects.class_id, tracked_objects.tracker_id)
-            if class_id == target_class_id
-        }
+        mask = tracked_objects.class_id == target_class_id
+        return tracked_objects.tracker_id[mask].astype(np.int32), tracked_objects.xyxy[mask].astype(np.float32)
+
+    def _fallback_ball_candidates(self, frames, ball_class_id):
+        if self.fallback_mode == "tiled":
+            return self._tiled_ball_candidates(frames, ball_class_id)
+
+        candidates = []
+        for i in range(0, len(frames), self.fallback_batch_size):
+            candidates.extend(self._predict_ball(frames[i:i+self.fallback_batch_size], ball_class_id, imgsz=1920))
+        return candidates
 
-    def _get_best_ball_bbox(self, supervision_detections, player_tracks, ball_class_id, last_position, max_distance):
-        all_detections = list(zip(supervision_detections.xyxy, supervision_detections.class_id, supervision_detections.confidence)) + \
-                         list(zip(player_tracks.xyxy, player_tracks.class_id, player_tracks.confidence))
-
-        return self._select_best_ball_bbox(all_detections, ball_class_id, last_position, max_distance)
-
-    def _fallback_ball_detection(self, frame, ball_class_id, last_position, max_distance):
-        fallback = self.model_ball.predict(
-            source=frame,
-            conf=0.46,
-            iou=0.3,
-            imgsz=1920,
-            classes=[ball_class_id],
-            augment=True,
-            agnostic_nms=True
-        )[0]
-        fallback_detections = sv.Detections.from_ultralytics(fallback)
-        return self._select_best_ball_bbox(zip(fallback_detections.xyxy, fallback_detections.class_id, fallback_detections.confidence), ball_class_id, last_position, max_distance)
+    def _roi_ball_candidates(self, frame, ball_class_id, last_position, predicted_position, misses):
+        """
+        Searches a window around the predicted ball position, plus one around the last known position
+        if the two are far apart. The window grows with every consecutive miss.
+        """
+        height, width = frame.shape[:2]
+        size = self.roi_size + self.roi_growth * misses
+        centers = [predicted_position]
+        if np.linalg.norm(np.subtract(predicted_position, last_position)) > size / 4:
+            centers.append(last_position)
+
+        windows = [get_search_window(center, size, width, height) for center in centers]
+        crops = [np.ascontiguousarray(frame[y1:y2, x1:x2]) for x1, y1, x2, y2 in windows]
+        imgsz = int(np.ceil(max(max(crop.shape[:2]) for crop in crops) / 32) * 32)
+
+        candidates = []
+        for (x1, y1, _, _), crop_candidates in zip(windows, self._predict_ball(crops, ball_class_id, imgsz)):
+            offset = np.array([x1, y1, x1, y1])
+            candidates.extend((bbox + offset, class_id, confidence) for bbox, class_id, confidence in crop_candidates)
+        return candidates
+
+    def _tiled_ball_candidates(self, frames, ball_class_id):
+        """
+        Splits every frame into overlapping tiles, runs the tiles of all frames through the ball model
+        in shared batches at native resolution and merges each frame's boxes with cross-tile NMS.
+        """
+        import supervision as sv
+        tiles = [
+            (index, window)
+            for index, frame in enumerate(frames)
+            for window in get_tile_windows(frame.shape[1], frame.shape[0], self.tile_size, self.tile_overlap)
+        ]
+
+        frame_candidates = [[] for _ in frames]
+        for i in range(0, len(tiles), self.tile_batch_size):
+            chunk = tiles[i:i+self.tile_batch_size]
+            crops = [np.ascontiguousarray(frames[index][y1:y2, x1:x2]) for index, (x1, y1, x2, y2) in chunk]
+            for (index, (x1, y1, _, _)), tile_candidates in zip(chunk, self._predict_ball(crops, ball_class_id, self.tile_size, augment=False)):
+                offset = np.array([x1, y1, x1, y1])
+                frame_candidates[index].extend((bbox + offset, class_id, confidence) for bbox, class_id, confidence in tile_candidates)
+
+        merged = []
+        for candidates in frame_candidates:
+            if not candidates:
+                merged.append([])
+                continue
+            xyxy, class_id, confidence = zip(*candidates)
+            detections = sv.Detections(
+                xyxy=np.array(xyxy, dtype=np.float32),
+                class_id=np.array(class_id, dtype=int),
+                confidence=np.array(confidence, dtype=np.float32)
+            ).with_nms(threshold=0.3, class_agnostic=True)
+            merged.append(list(zip(detections.xyxy, detections.class_id, detections.confidence)))
+        return merged
+
+    def _predict_ball(self, frames, ball_class_id, imgsz, augment=True):
+        import supervision as sv
+        self.metrics.count("ball_predict_images", len(frames))
+        with self.metrics.timer("ball_predict"):
+            results = self._predict(
+                self.model_ball,
+                "first_ball_inference",
+                source=frames,
+                conf=0.46,
+                iou=0.3,
+                imgsz=imgsz,
+                classes=[ball_class_id],
+                augment=augment and self.ball_tta,
+                agnostic_nms=True
+            )
+        candidates = []
+        for result in results:
+            fallback_detections = sv.Detections.from_ultralytics(result)
+            candidates.append(list(zip(fallback_detections.xyxy, fallback_detections.class_id, fallback_detections.confidence)))
+        return candidates
 
     def _select_best_ball_bbox(self, detections, ball_class_id, last_position, max_distance):
         best_score = -1
@@ -136,12 +689,21 @@ class Tracker:
         current_center = get_center_of_bbox(bbox)
         distance = np.linalg.norm(np.array(current_center) - np.array(last_position))
         distance_factor = max(0, 1 - distance / max_distance)
-        return confidence * 0.6 + distance_factor * 0.4
-
-    def _load_cached_tracks(self, path):
-        with open(path, 'rb') as file:
-            return pickle.load(file)
+        return confidence * self.ball_confidence_weight + distance_factor * (1 - self.ball_confidence_weight)
 
-    def _save_cached_tracks(self, tracks, path):
-        with open(path, 'wb') as file:
-            pickle.dump(tracks, file)
\ No newline at end of file
+    def _output_params(self, max_ball_distance):
+        """Every setting that can change the tracks; batch sizes are left out as they do not."""
+        return {
+            "conf_thresh": self.conf_thresh,
+            "detector_imgsz": self.detector_imgsz,
+            "iou_thresh": self.iou_thresh,
+            "max_ball_distance": max_ball_distance,
+            "fallback_mode": self.fallback_mode,
+            "roi": [self.roi_size, self.roi_growth, self.roi_max_misses],
+            "tiles": [self.tile_size, self.tile_overlap],
+            "bytetrack": self.bytetrack_params,
+            "ball_confidence_weight": self.ball_confidence_weight,
+            "backend": self.backend,
+            "ball_tta": self.ball_tta,
+            "detect_stride": [self.detect_stride, self.redetect_cut, self.redetect_motion, self.redetect_lost, self.flow_scale],
+        }
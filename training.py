@@ -1,7 +1,26 @@
 import os
+import json
+import time
+import hashlib
 from ultralytics import YOLO
 import torch
 import yaml
+from create_dataset import prepare_training_cache, MANIFEST_PATH as DATASET_MANIFEST_PATH
+from track_cache import fingerprint_weights, make_cache_key
+
+'''
+Trains the YOLO model in the stages defined in train_config.yaml, each stage starting from the
+previous stage's best.pt (the first from BASE_WEIGHTS).
+
+Every stage is fingerprinted from its config, its input weights and its data (data.yaml and the
+manifests of the datasets its train and val paths point at), and the run manifest at MANIFEST_PATH records the result:
+- A stage whose fingerprint and best.pt are unchanged since it completed is skipped.
+- A stage that was interrupted with the same fingerprint resumes from its last.pt.
+- Anything else trains from scratch, which in turn changes the input weights of the later stages.
+The manifest also holds each stage's wall time, epochs, images per second and final metrics.
+
+DEVICE is chosen here and overrides any device given in the stage configs.
+'''
 
 # Configuration
 PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -13,29 +32,132 @@ IMG_SIZE = 1024
 PROJECT_NAME = 'runs/soccer_training'
 RUN_NAME = 'exp'
 DEVICE = '0' if torch.cuda.is_available() else 'cpu'
+# Train each stage on images pre-resized to its imgsz (see create_dataset.prepare_training_cache)
+USE_IMAGE_CACHE = True
+STAGES = ["stage_1", "stage_2", "stage_3"]
+BASE_WEIGHTS = "yolov8s.pt"
+MANIFEST_PATH = "training_manifest.json"
+# settings that do not change what a stage learns, left out of its fingerprint
+UNFINGERPRINTED = ("device", "workers", "verbose", "exist_ok", "save_period")
+
+
+def stage_weights(params, name="best.pt"):
+    return os.path.join(params["project"], params["name"], "weights", name)
+
+
+def data_manifests(data_yaml):
+    """
+    Returns the manifest.json of every dataset the train and val paths of `data_yaml` point at, i.e.
+    two levels above each images folder (dataset/ or dataset/cache_<imgsz>/), or DATASET_MANIFEST_PATH if there is none.
+    """
+    with open(data_yaml, "r") as f:
+        data = yaml.safe_load(f)
+    root = os.path.join(os.path.dirname(os.path.abspath(data_yaml)), data.get("path") or "")
+    manifests = []
+    for split in ("train", "val"):
+        paths = data.get(split) or []
+        for images in paths if isinstance(paths, list) else [paths]:
+            manifests.append(os.path.normpath(os.path.join(root, images, "..", "..", "manifest.json")))
+    manifests = sorted(path for path in set(manifests) if os.path.exists(path))
+    return manifests or [DATASET_MANIFEST_PATH]
+
+
+def stage_fingerprint(params, weights_path):
+    data = hashlib.blake2b(digest_size=16)
+    for path in [params["data"]] + data_manifests(params["data"]):
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data.update(f.read())
+    return make_cache_key(
+        params={key: value for key, value in params.items() if key not in UNFINGERPRINTED},
+        weights=fingerprint_weights(weights_path) if os.path.exists(weights_path) else weights_path,
+        data=data.hexdigest()
+    )
+
+
+def load_manifest():
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, "r") as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(manifest):
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def run_stage(stage, params, weights_in, manifest):
+    fingerprint = stage_fingerprint(params, weights_in)
+    record = manifest.get(stage, {})
+    best = stage_weights(params)
+    last = stage_weights(params, "last.pt")
+
+    if (record.get("fingerprint") == fingerprint and record.get("status") == "complete"
+            and os.path.exists(best) and record.get("best_fingerprint") == fingerprint_weights(best)):
+        print(f"{stage}: up to date, skipping ({best})")
+        return best
+
+    resume = record.get("fingerprint") == fingerprint and record.get("status") == "running" and os.path.exists(last)
+    if not resume:
+        record = {"fingerprint": fingerprint, "weights_in": weights_in, "wall_s": 0.0}
+    record["status"] = "running"
+    manifest[stage] = record
+    save_manifest(manifest)
+
+    print(f"{stage}: {'resuming from ' + last if resume else 'training from ' + weights_in}")
+    model = YOLO(last if resume else weights_in)
+    previous_wall = record["wall_s"]
+    start = time.time()
+
+    def on_fit_epoch_end(trainer):
+        # keeps the manifest current, so the time of an interrupted session is not lost
+        record.update(wall_s=previous_wall + time.time() - start, epochs=trainer.epoch + 1)
+        save_manifest(manifest)
+
+    model.add_callback("on_fit_epoch_end", on_fit_epoch_end)
+    if resume:
+        model.train(resume=True, device=params["device"])
+    else:
+        model.train(**params)
+    wall = time.time() - start
 
-# Cleanup of GPU
-torch.cuda.empty_cache()
-torch.cuda.reset_peak_memory_stats()
+    trainer = model.trainer
+    epochs = trainer.epoch + 1 - trainer.start_epoch
+    record.update(
+        status="complete",
+        wall_s=previous_wall + wall,
+        epochs=trainer.epoch + 1,
+        images_per_s=epochs * len(trainer.train_loader.dataset) / wall if wall > 0 else None,
+        best=best,
+        best_fingerprint=fingerprint_weights(best),
+        metrics={key: float(value) for key, value in (trainer.metrics or {}).items()},
+    )
+    save_manifest(manifest)
+    print(f"{stage}: done in {wall / 60:.1f} min, {record['images_per_s']:.1f} images/s")
+    return best
 
-# Load training config
-with open("train_config.yaml", "r") as f:
-    config = yaml.safe_load(f)
 
-print("Starting YOLO training...")
+if __name__ == "__main__":
+    # Cleanup of GPU
+    torch.cuda.empty_cache()
+    torch.cuda.reset_peak_memory_stats()
 
-# Stage 1
-model = YOLO("yolov8s.pt")
-model.train(**config["stage_1"])
+    # Load training config
+    with open("train_config.yaml", "r") as f:
+        config = yaml.safe_load(f)
 
-# Stage 2
-stage2_weights = os.path.join(config["stage_1"]["project"], config["stage_1"]["name"], "weights", "best.pt")
-model = YOLO(stage2_weights)
-model.train(**config["stage_2"])
+    for stage in STAGES:
+        config[stage]["device"] = DEVICE
+        if USE_IMAGE_CACHE:
+            config[stage]["data"] = prepare_training_cache(config[stage]["imgsz"], config[stage]["data"])
 
-# Stage 3
-stage3_weights = os.path.join(config["stage_2"]["project"], config["stage_2"]["name"], "weights", "best.pt")
-model = YOLO(stage3_weights)
-model.train(**config["stage_3"])
+    print("Starting YOLO training...")
+    manifest = load_manifest()
+    weights = BASE_WEIGHTS
+    for stage in STAGES:
+        weights = run_stage(stage, config[stage], weights, manifest)
 
-print("Training complete.")
+    print(f"Training complete. Final weights: {weights}")